@@ -3,7 +3,6 @@ from __future__ import annotations
 import argparse
 import csv
 import os
-import random
 import warnings
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -63,6 +62,8 @@ N_REPEATS = 3
 
 true_state_names = ['W', 'X', 'Y', 'Z', 'Wp', 'Xp', 'Yp', 'Zp']
 scrambled_positions = [0, 1, 2, 3, 4, 5, 6, 7]
+state_map = {'W': 1, 'X': 2, 'Y': 3, 'Z': 4, 'Wp': 5, 'Xp': 6, 'Yp': 7, 'Zp': 8}
+state_seq = {s: (1 if n <= 4 else 2) for s, n in state_map.items()}
 
 warnings.filterwarnings(
     "ignore",
@@ -91,20 +92,29 @@ class AppliedLearning:
     behavior_file: object = field(init=False)
     behavior_writer: csv.writer = field(init=False)
     scrambling_rule: Dict[str, int] = field(init=False)
+    inv_scrambling_rule: Dict[int, str] = field(init=False)
     object_mapping: Dict[str, str] = field(init=False)
     object_stims: Dict[str, visual.ImageStim] = field(init=False)
     meg: MetaPort = field(init=False)
+    rng: np.random.Generator = field(init=False)
 
     def __post_init__(self) -> None:
         # Load this subject's scrambling rule from Day1
         self.scrambling_rule = get_scrambling_rule(self.subject_id)
+        self.inv_scrambling_rule = {v: k for k, v in self.scrambling_rule.items()}
         # Force a new object mapping, to make sure it's novel for this subject
         self.object_mapping = get_object_mapping(self.subject_id, 'applied_learning', force_new=True)
         
+        # useFBO=False skips the framebuffer round-trip on every flip and
+        # checkTiming=False skips the startup timing probe; vsync stays on
+        # (waitBlanking default) since the stimulus stream is frame-locked.
         if fullscreen:
-            self.win = visual.Window(color="black", fullscr=True, units="norm")
+            self.win = visual.Window(color="black", fullscr=True, units="norm",
+                                     allowGUI=False, useFBO=False, checkTiming=False)
         else:
-            self.win = visual.Window(color="black", size=(WIN_WIDTH, WIN_HEIGHT), units="norm")
+            self.win = visual.Window(color="black", size=(WIN_WIDTH, WIN_HEIGHT), units="norm",
+                                     useFBO=False, checkTiming=False)
+        self.win.recordFrameIntervals = False
 
         event.globalKeys.clear()
         event.globalKeys.add(key="escape", func=self._exit)
@@ -112,18 +122,118 @@ class AppliedLearning:
         # Create MEG trigger object
         self.meg = MetaPort(self.subject_id, actual_meg)
 
-        # Open behavioral data file
+        # Pre-build the stims reused on every trial. Constructing a TextStim/Rect
+        # is far more expensive than drawing an existing one, so the hot loops
+        # below only call .draw() on these cached instances.
+        self._fixation = visual.TextStim(self.win, text='+', height=0.3, pos=(0,0))
+        self._quiz_prompt = visual.TextStim(self.win, text='When the options appear, choose the one that comes later in the same true sequence.',
+                                            height=0.07, pos=(0,0))
+        self._left_label = visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5,-.5))
+        self._right_label = visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5,-.5))
+        self._timeout_msg = visual.TextStim(self.win, text='Too slow. Respond faster.', height=0.1, pos=(0,0))
+        w, h = self.win.size
+        s = 50  # square size in pixels
+        self._photodiode = visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
+                                       pos=(-w/2 + s/2, -h/2 + s/2))
+
+        # Frame-locked durations for the stimulus stream: driving timing with
+        # win.flip() pins onsets to the display refresh instead of core.wait's
+        # CPU spin-wait.
+        self._fps = self.win.getActualFrameRate() or 60
+        self._isi_frames = int(round(ISI * self._fps))
+        self._object_frames = int(round(OBJECT_DURATION * self._fps))
+        self._iti_frames = int(round(ITI * self._fps))
+        self._probe_alone_frames = int(round(PROBE_ALONE_DURATION * self._fps))
+
+        # Deterministic RNG per participant; quiz randomness is pre-sampled
+        # in bulk per run rather than drawn trial by trial.
+        self.rng = np.random.default_rng(self.subject_id)
+
+        # (pos, seq) only has 8 combinations, so tabulate the state names once
+        # instead of calling pos_and_seq_to_state in the trial loop.
+        self._pos_seq_to_state = {(p, s): pos_and_seq_to_state(pos=p, seq=s)
+                                  for p in range(1, 5) for s in (1, 2)}
+
+        # The behavioral data file is opened lazily on the first quiz trial, so
+        # the directory/file syscalls don't delay the start of the experiment.
+        self.behavior_file = None
+        self.behavior_writer = None
+        # Reusable row buffer: csv.writer accepts any iterable, so quiz_screen
+        # fills this in place instead of allocating a 20-element list per trial.
+        self._row_buf = [None] * 20
+        # Rows accumulate here during a run and are written in one writerows
+        # call at the run boundary, off the trial-timing path.
+        self._pending_rows = []
+
+        # pre-load images
+        self._texture_cache = {}   # obj_name -> ImageStim, survives mapping refreshes
+        self._orig_size = {}       # obj_name -> native (w, h) captured at load time
+        self._fitted_sizes = {}    # (obj_name, requested size) -> aspect-fitted size
+        self._applied_size = {}    # obj_name -> (obj_name, requested size) last applied
+        self._loaded_mapping = None  # mapping the current object_stims were built for
+        self.preload_images()
+
+    def sample_quiz_trials(self, n: int) -> list:
+        """Pre-sample the randomness for *n* quiz trials in one numpy batch.
+
+        Returns a list of (probe_state, correct_state, incorrect_state,
+        correct_on_left) tuples following the same constraints quiz_screen
+        used to apply with per-trial random.choice calls.
+        """
+        prob_seqs = self.rng.integers(1, 3, size=n)
+        prob_positions = self.rng.integers(1, 4, size=n)
+        correct_u = self.rng.random(size=n)    # drives the correct-position draw
+        incorrect_seqs = self.rng.integers(1, 3, size=n)
+        incorrect_u = self.rng.random(size=n)  # drives the incorrect-position draw
+        left_flags = self.rng.integers(0, 2, size=n)
+
+        trials = []
+        for i in range(n):
+            prob_seq = int(prob_seqs[i])
+            prob_pos = int(prob_positions[i])
+            probe_state = self._pos_seq_to_state[(prob_pos, prob_seq)]
+
+            # The correct choice comes later in the same sequence
+            correct_pos = prob_pos + 1 + int(correct_u[i] * (4 - prob_pos))
+            correct_state = self._pos_seq_to_state[(correct_pos, prob_seq)]
+
+            # The incorrect choice  (TODO: make sure it's 33% prob of being from the same sequence)
+            if prob_pos == 1:
+                # if the probe is at the first position, then the incorrect choice must be from the other sequence
+                incorrect_seq = 3 - prob_seq
+            else:
+                # otherwise we can choose a sequence randomly
+                incorrect_seq = int(incorrect_seqs[i])
+
+            if incorrect_seq == prob_seq:
+                # if they're in the same sequence, then the incorrect choice must come earlier
+                incorrect_pos = 1 + int(incorrect_u[i] * (prob_pos - 1))
+            else:
+                # if they're in different sequences, then the incorrect choice can come from any position
+                incorrect_pos = 1 + int(incorrect_u[i] * 4)
+            incorrect_state = self._pos_seq_to_state[(incorrect_pos, incorrect_seq)]
+
+            trials.append((probe_state, correct_state, incorrect_state, bool(left_flags[i])))
+
+        return trials
+
+    def open_behavior_file(self) -> None:
+        """Open the behavior CSV and write the header, if not already open."""
+        if self.behavior_file is not None:
+            return
         os.makedirs('behavior_data', exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         file_name = f"subject_{self.subject_id}_applied_learning_behavior_{timestamp}.csv"
         self.behavior_filename = os.path.join('behavior_data', file_name)
-        self.behavior_file = open(self.behavior_filename, "w", newline="")
+        # Large buffer: rows are written per trial but only flushed at run
+        # boundaries, keeping disk latency out of the quiz loop.
+        self.behavior_file = open(self.behavior_filename, "w", newline="", buffering=65536)
 
         self.behavior_writer = csv.writer(self.behavior_file)
         self.behavior_writer.writerow([
             "subject_id",
             "run_number",
-            "probe_stimulus_picture",    
+            "probe_stimulus_picture",
             "probe_stimulus_true_state",
             "probe_stim_number",
             "probe_stim_seq",
@@ -136,25 +246,53 @@ class AppliedLearning:
             "incorrect_stim_number",
             "incorrect_stim_seq",
             "correct_state_on_left",  # True = left, False = right
-            "key_pressed", 
-            "chosen_true_state", 
+            "key_pressed",
+            "chosen_true_state",
             "chosen_state_picture",
-            "is_correct", 
-            "reaction_time", 
+            "is_correct",
+            "reaction_time",
         ])
 
-        # pre-load images
-        self.object_stims = {}
-        for letter, obj_name in self.object_mapping.items():
-            img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[letter] = visual.ImageStim(self.win, image=str(img_path))
-       
+    def write_pending_rows(self) -> None:
+        """Write any accumulated behavior rows to disk in one batch.
+
+        Fields are plain identifiers and numbers (no commas/quotes -- asserted
+        at image load), so a str join is enough and skips the csv module's
+        per-cell quoting scan. None becomes an empty field, as csv would write.
+        """
+        if not self._pending_rows:
+            return
+        self.open_behavior_file()
+        self.behavior_file.write("".join(
+            ",".join("" if v is None else str(v) for v in row) + "\n"
+            for row in self._pending_rows
+        ))
+        self._pending_rows.clear()
+        self.behavior_file.flush()
+        os.fsync(self.behavior_file.fileno())
+
     def preload_images(self) -> None:
         """Helper method to load/reload images"""
+        # Nothing to do if the mapping hasn't changed since the last load.
+        if self.object_mapping == self._loaded_mapping:
+            return
+        # Reuse previously built stims so a mapping refresh between runs does
+        # not re-decode the PNG and re-upload the texture to the GPU.
         self.object_stims = {}
         for letter, obj_name in self.object_mapping.items():
-            img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[letter] = visual.ImageStim(self.win, image=str(img_path))
+            assert ',' not in obj_name, f"picture name {obj_name!r} would corrupt the CSV"
+            stim = self._texture_cache.get(obj_name)
+            if stim is None:
+                img_path = IMAGES_DIR / f"{obj_name}.png"
+                stim = visual.ImageStim(self.win, image=str(img_path))
+                self._texture_cache[obj_name] = stim
+                # Record the native size now, before get_object mutates .size
+                self._orig_size[obj_name] = tuple(stim.size)
+            self.object_stims[letter] = stim
+        # Picture names (mapping value minus the session-number prefix),
+        # precomputed so quiz_screen doesn't re-slice on every trial.
+        self._obj_picture = {letter: obj_name[1:] for letter, obj_name in self.object_mapping.items()}
+        self._loaded_mapping = dict(self.object_mapping)
 
     def _exit(self):
         print("Esc detected: ending experiment...")
@@ -171,30 +309,44 @@ class AppliedLearning:
         except Exception:
             pass
         try:
-            self.behavior_file.close()
+            self.write_pending_rows()
+            if self.behavior_file is not None:
+                self.behavior_file.close()
         except Exception:
             pass
 
     def get_object(self, true_state: str, size=(0.5, 0.5), pos=(0, 0)) -> visual.ImageStim:
-        """Display an image corresponding to the specified object letter (W, X, Y, Z, Wp, Xp, Yp, Zp)."""
+        """Display an image corresponding to the specified object letter (W, X, Y, Z, Wp, Xp, Yp, Zp).
+
+        Only a handful of (image, size) pairs ever occur, so the aspect-fit
+        arithmetic is memoized and the stim's size is rewritten only when it
+        differs from what was last applied.
+        """
         stim = self.object_stims[true_state]
-        orig_w, orig_h = stim.size
-        s_f = min(size[0] / orig_w, size[1] / orig_h)
-        stim.size = (orig_w * s_f, orig_h * s_f)
+        obj_name = self.object_mapping[true_state]
+        key = (obj_name, size)
+        fitted = self._fitted_sizes.get(key)
+        if fitted is None:
+            orig_w, orig_h = self._orig_size[obj_name]
+            s_f = min(size[0] / orig_w, size[1] / orig_h)
+            fitted = (orig_w * s_f, orig_h * s_f)
+            self._fitted_sizes[key] = fitted
+        # Assigning .size makes PsychoPy rebuild the stim's vertices, so only
+        # touch it when the requested size actually changed.
+        if self._applied_size.get(obj_name) != key:
+            stim.size = fitted
+            self._applied_size[obj_name] = key
         stim.pos = pos
         return stim
 
     def draw_photodiode_square(self) -> None:
-        w, h = self.win.size
-        s = 50  # square size in pixels
-        visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
-                    pos=(-w/2 + s/2, -h/2 + s/2)).draw()
+        self._photodiode.draw()
 
 
     def reverse_state_lookup(self, scrambled_position):
         """ Finds the unscrambled state that maps to scrambled_position. """
-        # Uses reverse dictionary lookup.
-        return [key for key, value in self.scrambling_rule.items() if value == scrambled_position][0]
+        # O(1) lookup in the precomputed inverse mapping.
+        return self.inv_scrambling_rule[scrambled_position]
 
     def run(self):
         
@@ -206,76 +358,67 @@ class AppliedLearning:
 
             for scrambled_position in sp_list:
                 # Fixation
-                visual.TextStim(self.win, text='+', height=0.3, pos=(0,0)).draw()
+                self._fixation.draw()
                 self.meg.write('fixation') # send trigger
                 self.win.flip()
-                core.wait(ISI)
+                for _ in range(self._isi_frames - 1):
+                    self._fixation.draw()
+                    self.win.flip()
 
                 # Object
                 state_name = self.reverse_state_lookup(scrambled_position)
-                self.get_object(state_name, size=(0.5,0.5), pos=(0,0)).draw()
+                obj_stim = self.get_object(state_name, size=(0.5,0.5), pos=(0,0))
+                obj_stim.draw()
                 self.draw_photodiode_square()
                 self.meg.write(state_name) # send trigger
                 self.win.flip()
-                core.wait(OBJECT_DURATION)
+                for _ in range(self._object_frames - 1):
+                    obj_stim.draw()
+                    self.draw_photodiode_square()
+                    self.win.flip()
 
-            self.win.flip()
-            core.wait(ITI)
-
-        def quiz_screen(run_number: int):
-
-            # Select the probe state
-            prob_seq = random.choice([1,2])
-            prob_pos = random.choice([1,2,3])
-            probe_state = pos_and_seq_to_state(pos=prob_pos, seq=prob_seq)
-            
-            # Select the correct choice option
-            correct_seq = prob_seq
-            correct_pos = random.choice(range(prob_pos+1,5))
-            correct_state = pos_and_seq_to_state(pos=correct_pos, seq=correct_seq)
-
-            # Select the incorrect choice option  (TODO: make sure it's 33% prob of being from the same sequence)
-            if prob_pos == 1:
-                # if the probe is at the first position, then the incorrect choice must be from the other sequence
-                incorrect_seq = 3-prob_seq
-            else:
-                # otherwise we can choose a sequence randomly
-                incorrect_seq = random.choice([1,2])
-
-            if incorrect_seq == prob_seq:
-                # if they're in the same sequence, then the incorrect choice must come earlier
-                incorrect_pos = random.choice(range(1,prob_pos))
-            else:
-                # if they're in different sequences, then the incorrect choice can come from any position
-                incorrect_pos = random.choice([1,2,3,4])
-
-            incorrect_state = pos_and_seq_to_state(pos=incorrect_pos, seq=incorrect_seq)
+            for _ in range(self._iti_frames):
+                self.win.flip()
 
-            # Randomly decide whether to put the correct choice on the left side of the screen
-            correct_on_left = random.choice([True,False])
+        def quiz_screen(run_number: int, probe_state: str, correct_state: str,
+                        incorrect_state: str, correct_on_left: bool):
 
             # Draw the question
-            visual.TextStim(self.win, text='When the options appear, choose the one that comes later in the same true sequence.', 
-                            height=0.07, pos=(0,0)).draw()
+            self._quiz_prompt.draw()
             self.meg.write('quiz_text') # send trigger
             self.win.flip()
             core.wait(MESSAGE_DURATION)
 
-            # Draw the probe stimulus
-            visual.TextStim(self.win, text='When the options appear, choose the one that comes later in the same true sequence.', 
-                            height=0.07, pos=(0,0)).draw()
-            self.get_object(probe_state, size=(0.5,0.5), pos=(0,.5)).draw()
+            # Pre-render the probe frame once: it is static for the whole
+            # probe-alone period, so each refresh blits a single texture
+            # instead of re-laying-out the text and image.
+            probe_frame = visual.BufferImageStim(self.win, stim=[
+                self._quiz_prompt,
+                self.get_object(probe_state, size=(0.5,0.5), pos=(0,.5)),
+            ])
 
             # Present the probe stimulus alone for a duration
+            probe_frame.draw()
             self.meg.write('probe_state') # send trigger
             self.win.flip()
-            core.wait(PROBE_ALONE_DURATION)
 
-            # Draw the two choices
-            self.get_object(correct_state, size=(0.5,0.5), pos=(-(2*int(correct_on_left)-1)*.5,0)).draw()
-            self.get_object(incorrect_state, size=(0.5,0.5), pos=((2*int(correct_on_left)-1)*.5,0)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5,-.5)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5,-.5)).draw()
+            # Compose the choice frame into a single texture while the probe
+            # is up, so the RT-critical choice onset is one draw call instead
+            # of five.
+            choice_frame = visual.BufferImageStim(self.win, stim=[
+                self.get_object(correct_state, size=(0.5,0.5), pos=(-(2*int(correct_on_left)-1)*.5,0)),
+                self.get_object(incorrect_state, size=(0.5,0.5), pos=((2*int(correct_on_left)-1)*.5,0)),
+                self._left_label,
+                self._right_label,
+            ])
+            for _ in range(self._probe_alone_frames - 1):
+                probe_frame.draw()
+                self.win.flip()
+
+            # Draw the two choices. Drop any keypresses accumulated during the
+            # probe-alone period so waitKeys doesn't traverse a stale queue.
+            event.clearEvents(eventType='keyboard')
+            choice_frame.draw()
             self.meg.write('quiz_choices') # send trigger
             self.win.flip()
             clock = core.Clock()
@@ -290,7 +433,7 @@ class AppliedLearning:
                 chosen_state = None
                 chosen_obj = None
 
-                visual.TextStim(self.win, text='Too slow. Respond faster.', height=0.1, pos=(0,0)).draw()
+                self._timeout_msg.draw()
                 self.meg.write('timeout_message') # send trigger
                 self.win.flip()
                 core.wait(TIMEOUT_MESSAGE_DURATION)
@@ -299,52 +442,47 @@ class AppliedLearning:
                 self.meg.write(key + '_press') # send trigger
 
                 sj_correctness = ((key == "1") and correct_on_left) or ((key == "2") and (not correct_on_left))
-                chosen_state = correct_state if (key == "1" and correct_on_left or key=="2" and not correct_on_left) else incorrect_state
+                chosen_state = correct_state if sj_correctness else incorrect_state
                 # sj_correctness = ((key == "left") and correct_on_left) or ((key == "right") and (not correct_on_left))
-                # chosen_state = correct_state if (key == "left" and correct_on_left or key=="right" and not correct_on_left) else incorrect_state
-                chosen_obj = self.object_mapping[chosen_state][1:]
-            
-            # State mapping
-            state_map = {'W':1, 'X':2, 'Y':3, 'Z':4, 'Wp':5, 'Xp':6, 'Yp':7, 'Zp':8}
+                chosen_obj = self._obj_picture[chosen_state]
 
             # Probe info
             probe_stim_number = state_map[probe_state]
-            probe_stim_seq = 1 if probe_stim_number <= 4 else 2
+            probe_stim_seq = state_seq[probe_state]
 
             # Correct
-            correct_stim_picture = self.object_mapping[correct_state][1:]
+            correct_stim_picture = self._obj_picture[correct_state]
             correct_stim_number = state_map[correct_state]
-            correct_stim_seq = 1 if correct_stim_number <= 4 else 2
+            correct_stim_seq = state_seq[correct_state]
 
             # Right
-            incorrect_stim_picture = self.object_mapping[incorrect_state][1:]
+            incorrect_stim_picture = self._obj_picture[incorrect_state]
             incorrect_stim_number = state_map[incorrect_state]
-            incorrect_stim_seq = 1 if incorrect_stim_number <= 4 else 2
-
-            # Record data to behavior file
-            self.behavior_writer.writerow([
-                self.subject_id,
-                run_number + 1,  # Add 1 to make it 1-indexed (1, 2, 3) instead of 0-indexed
-                self.object_mapping[probe_state][1:],  # probe_picture
-                probe_state,
-                probe_stim_number,
-                probe_stim_seq,
-                correct_stim_picture, # correct_picture
-                correct_state,
-                correct_stim_number,
-                correct_stim_seq,
-                incorrect_stim_picture,  # incorrect_picture
-                incorrect_state,
-                incorrect_stim_number,
-                incorrect_stim_seq,
-                int(correct_on_left),
-                key,
-                chosen_state,
-                chosen_obj,  # picture
-                int(sj_correctness),
-                rt,
-            ])
-            self.behavior_file.flush()
+            incorrect_stim_seq = state_seq[incorrect_state]
+
+            # Record data to behavior file (fields match the header order)
+            row = self._row_buf
+            row[0] = self.subject_id
+            row[1] = run_number + 1  # Add 1 to make it 1-indexed (1, 2, 3) instead of 0-indexed
+            row[2] = self._obj_picture[probe_state]  # probe_picture
+            row[3] = probe_state
+            row[4] = probe_stim_number
+            row[5] = probe_stim_seq
+            row[6] = correct_stim_picture  # correct_picture
+            row[7] = correct_state
+            row[8] = correct_stim_number
+            row[9] = correct_stim_seq
+            row[10] = incorrect_stim_picture  # incorrect_picture
+            row[11] = incorrect_state
+            row[12] = incorrect_stim_number
+            row[13] = incorrect_stim_seq
+            row[14] = int(correct_on_left)
+            row[15] = key
+            row[16] = chosen_state
+            row[17] = chosen_obj  # picture
+            row[18] = int(sj_correctness)
+            row[19] = rt
+            self._pending_rows.append(tuple(row))
 
 
         ################ Do the applied learning task ################
@@ -370,12 +508,15 @@ class AppliedLearning:
             self.win.flip()
             core.wait(QUIZ_WAIT_TIME)
 
-            # Quiz phase
-            for probe_ix in range(40):
-                quiz_screen(run_number=run)  # Pass run number to quiz_screen
+            # Quiz phase (randomness pre-sampled for the whole run)
+            for quiz_trial in self.sample_quiz_trials(40):
+                quiz_screen(run, *quiz_trial)
                 self.win.flip()
                 core.wait(ISI)
 
+            # Persist this run's rows before moving on
+            self.write_pending_rows()
+
         visual.TextStim(self.win, text="All done.", height=0.1, pos=(0,0.0)).draw()
         visual.TextStim(self.win, text="Thank you for your participation!", height=0.07, pos=(0,-0.5)).draw()
         self.win.flip()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import csv
+import numpy as np
 import os
 import random
 import warnings
@@ -11,6 +12,7 @@ from pathlib import Path
 from typing import Dict
 
 from psychopy import core, event, visual
+from psychopy.hardware import keyboard
 
 from .trigger import MetaPort
 from .utils import SESSION2_OBJECTS
@@ -21,6 +23,7 @@ GLOBAL_DEBUG = False # Do not use when running participants!
 
 CORRECT_KEY = "1"   # left
 INCORRECT_KEY = "2" # right
+RESPONSE_KEYS = [CORRECT_KEY, INCORRECT_KEY]
 
 
 N_BLOCKS = 3
@@ -68,6 +71,7 @@ class FunctionalLocalizer:
     behavior_writer: csv.writer = field(init=False)
     object_stims: Dict[str, visual.ImageStim] = field(init=False)
     rng: random.Random = field(init=False)
+    np_rng: np.random.Generator = field(init=False)
     meg: MetaPort = field(init=False)
     
     def __post_init__(self) -> None:
@@ -88,8 +92,11 @@ class FunctionalLocalizer:
         os.makedirs("behavior_data", exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"subject_{self.subject_id}_functional_localizer_behavior_{timestamp}.csv"
-        self.behavior_file = open(Path("behavior_data") / filename, "w", newline="")
+        # Large explicit buffer: trial rows are staged in memory and written
+        # in batches, so no write syscall lands inside the stimulus loop
+        self.behavior_file = open(Path("behavior_data") / filename, "w", newline="", buffering=65536)
         self.behavior_writer = csv.writer(self.behavior_file)
+        self._row_buf = []
         self.behavior_writer.writerow(
             [
                 "subject_id",
@@ -104,8 +111,36 @@ class FunctionalLocalizer:
         )
 
         self.rng = random.Random(self.subject_id)
+        self.np_rng = np.random.default_rng(self.subject_id)
+
+        # ptb-backed keyboard: events are timestamped by the backend rather
+        # than when a Python polling loop notices them
+        self._kb = keyboard.Keyboard()
         self.preload_images()
 
+        # Measured refresh rate for frame-locked stimulus timing
+        self._fps = self.win.getActualFrameRate() or 60
+        self._gap_frames = max(1, int(round(0.05 * self._fps)))
+        self._feedback_frames = max(1, int(round(FEEDBACK_DURATION * self._fps)))
+        self._resp_frames = max(1, int(round(TEXT_DURATION * self._fps)))
+
+        # Per-role stims reused across trials; only .text changes per trial
+        self._label_stim = visual.TextStim(self.win, text="", color="white", height=0.1, pos=(0, 0))
+        self._feedback_stim = visual.TextStim(self.win, text="", color="white", height=0.1, pos=(0, 0))
+        self._fixation_stim = visual.TextStim(self.win, text="+", color="white", height=0.2, pos=(0, 0))
+        w, h = self.win.size
+        s = 50  # square size in pixels
+        self._photodiode = visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
+                                       pos=(-w/2 + s/2, -h/2 + s/2))
+
+        # Draw each cached text height once so font rasterization and shader
+        # setup happen now, not on the first timed trial
+        self._label_stim.text = 'A'
+        self._label_stim.draw()
+        self._fixation_stim.draw()
+        self.win.flip()
+        self.win.flip()
+
     def _exit(self) -> None:
         print("Esc detected: ending experiment...")
         self.close()
@@ -116,7 +151,13 @@ class FunctionalLocalizer:
         self.object_stims = {}
         for obj_name in SESSION2_OBJECTS:
             img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[obj_name] = visual.ImageStim(self.win, image=str(img_path))
+            stim = visual.ImageStim(self.win, image=str(img_path))
+            # Aspect-fit into the 0.5 x 0.5 display box once here, so no
+            # per-trial rescaling is needed
+            orig_w, orig_h = stim.size
+            s_f = min(0.5 / orig_w, 0.5 / orig_h)
+            stim.size = (orig_w * s_f, orig_h * s_f)
+            self.object_stims[obj_name] = stim
 
     def close(self) -> None:
         self.meg.close() # close the trigger system
@@ -126,39 +167,45 @@ class FunctionalLocalizer:
         except Exception:
             pass
         try:
+            self.write_pending_rows()
+            self.behavior_file.flush()
+            os.fsync(self.behavior_file.fileno())
             self.behavior_file.close()
         except Exception:
             pass
 
-    def get_object(self, obj_name: str, size=(0.5, 0.5), pos=(0, 0)) -> visual.ImageStim:
-        stim = self.object_stims[obj_name]
-        orig_w, orig_h = stim.size
-        s_f = min(size[0] / orig_w, size[1] / orig_h)
-        stim.size = (orig_w * s_f, orig_h * s_f)
-        stim.pos = pos
-        return stim
+    def write_pending_rows(self) -> None:
+        """Write staged behavior rows out in one batch.
 
-    def build_trials(self) -> list[str]:
-        trials = [[] for _ in range(N_BLOCKS)]
-        n_repeats_per_block = int(N_TRIALS / (N_BLOCKS * len(SESSION2_OBJECTS)))
-        
-        for i_block in range(N_BLOCKS):
-            for _ in range(n_repeats_per_block):
-                perm = self.rng.sample(SESSION2_OBJECTS, len(SESSION2_OBJECTS))
-                trials[i_block].extend(perm)
+        Fields are plain identifiers, numbers and bools (no commas or
+        quotes), so a str join is enough and skips the csv module's
+        per-cell quoting scan.
+        """
+        if self._row_buf:
+            self.behavior_file.write("".join(
+                ",".join(str(v) for v in row) + "\n" for row in self._row_buf))
+            self._row_buf.clear()
 
-        return trials
+    def get_object(self, obj_name: str) -> visual.ImageStim:
+        """Return the preloaded, pre-sized stim for this object."""
+        return self.object_stims[obj_name]
+
+    def build_trials(self) -> list[list[str]]:
+        n_repeats_per_block = int(N_TRIALS / (N_BLOCKS * len(SESSION2_OBJECTS)))
+        objs = np.array(SESSION2_OBJECTS)
+        # One argsort over a matrix of random floats draws every per-block
+        # permutation at once instead of 30 Python-level shuffles
+        idx = np.argsort(self.np_rng.random((N_BLOCKS * n_repeats_per_block, len(objs))), axis=1)
+        perms = objs[idx].reshape(N_BLOCKS, -1)
+        return [block.tolist() for block in perms]
 
     def draw_photodiode_square(self) -> None:
-        w, h = self.win.size
-        s = 50  # square size in pixels
-        visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
-                    pos=(-w/2 + s/2, -h/2 + s/2)).draw()
+        self._photodiode.draw()
 
     def run(self) -> None:
         block_list = self.build_trials()
-        match_flags = [True] * int(N_TRIALS/2) + [False] * int(N_TRIALS/2)
-        self.rng.shuffle(match_flags)
+        match_flags = self.np_rng.permutation(
+            np.repeat([True, False], int(N_TRIALS / 2))).tolist()
 
         # for trial_list in block_list:
         #     print(trial_list)
@@ -175,64 +222,103 @@ class FunctionalLocalizer:
         # Functional Localizer main trial loop
 
         for trial_list in block_list:
-            for trial_num, obj_name in enumerate(trial_list, start=1):
-                event.clearEvents()
-                is_match = match_flags[trial_num - 1]
-                image_duration = self.rng.uniform(IMAGE_MIN, IMAGE_MAX)
-
-                # Determine text name
-                if is_match:
-                    text_name = obj_name
+            # Pre-draw all per-trial randomness so the stimulus loop only
+            # indexes ready-made values
+            n = len(trial_list)
+            image_durations = [self.rng.uniform(IMAGE_MIN, IMAGE_MAX) for _ in range(n)]
+            itis = [self.rng.uniform(ITI_MIN, ITI_MAX) for _ in range(n)]
+            n_objs = len(SESSION2_OBJECTS)
+            text_names = []
+            for i, obj in enumerate(trial_list):
+                if match_flags[i]:
+                    text_names.append(obj)
                 else:
-                    others = [o for o in SESSION2_OBJECTS if o != obj_name]
-                    text_name = self.rng.choice(others)
+                    # Uniform draw over the other objects without building a
+                    # filtered list: remap a collision to the last index
+                    j = self.rng.randrange(n_objs - 1)
+                    if SESSION2_OBJECTS[j] == obj:
+                        j = n_objs - 1
+                    text_names.append(SESSION2_OBJECTS[j])
 
-                # Show image
-                self.get_object(obj_name).draw()
-                self.draw_photodiode_square()
-                self.meg.write(obj_name) # send trigger
-                self.win.flip()
-                core.wait(image_duration)
+            for trial_num, obj_name in enumerate(trial_list, start=1):
+                self._kb.clearEvents()
+                is_match = match_flags[trial_num - 1]
+                image_duration = image_durations[trial_num - 1]
+                text_name = text_names[trial_num - 1]
+
+                # Show image, frame-locked so onset and offset land on a
+                # vertical retrace instead of an arbitrary sleep boundary
+                image_frames = max(1, int(round(image_duration * self._fps)))
+                stim = self.get_object(obj_name)
+                # autoDraw lets the window redraw the stims itself on each
+                # flip, skipping the per-frame Python draw calls
+                stim.autoDraw = True
+                self._photodiode.autoDraw = True
+                # Trigger fires from the flip callback, right after the swap
+                self.win.callOnFlip(self.meg.write, obj_name)
+                for _ in range(image_frames):
+                    self.win.flip()
+                stim.autoDraw = False
+                self._photodiode.autoDraw = False
 
                 # 50 ms between image and text, to give a break in the photodiode square
-                self.win.flip()
-                core.wait(0.05)
+                for _ in range(self._gap_frames):
+                    self.win.flip()
 
                 # Show name of object
                 text_label = text_name[1:].capitalize()
-                visual.TextStim(self.win, text=text_label, color="white", height=0.1, pos=(0, 0)).draw()
+                self._label_stim.text = text_label
+                self._label_stim.draw()
                 self.draw_photodiode_square()
-                self.meg.write(text_label) # send trigger
+                self.win.callOnFlip(self.meg.write, text_label)
+                # RT clock restarts on the same flip that shows the word, and
+                # the queue is dropped there too so presses made during the
+                # image can't be picked up as this trial's response
+                self.win.callOnFlip(self._kb.clock.reset)
+                self.win.callOnFlip(self._kb.clearEvents)
                 self.win.flip()
 
-                # Get keypress from user
-                resp_clock = core.Clock()
-                keys = event.waitKeys(maxWait=TEXT_DURATION, keyList=[CORRECT_KEY, INCORRECT_KEY], timeStamped=resp_clock)
+                # Poll the keyboard once per refresh while keeping the word
+                # on screen; each flip blocks on vsync, yielding the GIL to
+                # the trigger worker instead of spinning in waitKeys
+                keys = None
+                for _ in range(self._resp_frames - 1):
+                    k = self._kb.getKeys(keyList=RESPONSE_KEYS,
+                                         waitRelease=False, clear=True)
+                    if k:
+                        keys = k
+                        break
+                    self._label_stim.draw()
+                    self.draw_photodiode_square()
+                    self.win.flip()
 
                 if keys:
-                    key, rt = keys[0]
+                    key, rt = keys[0].name, keys[0].rt
                     self.meg.write(key + '_press') # send trigger
 
                     correct = (key == CORRECT_KEY and is_match) or (key == INCORRECT_KEY and not is_match)
                     feedback = "Correct" if correct else "Incorrect"
-                    self.behavior_writer.writerow(
+                    self._row_buf.append(
                         [self.subject_id, trial_num, obj_name, text_name, is_match, key, correct, rt]
                     )
                 else:
                     feedback = "please respond faster"
-                    self.behavior_writer.writerow(
+                    self._row_buf.append(
                         [self.subject_id, trial_num, obj_name, text_name, is_match, "", "", ""]
                     )
 
-                visual.TextStim(self.win, text=feedback, color="white", height=0.1, pos=(0, 0)).draw()
-                self.win.flip()
-                self.meg.write('feedback_message') # send trigger
-                core.wait(FEEDBACK_DURATION)
+                self._feedback_stim.text = feedback
+                self._feedback_stim.autoDraw = True
+                self.win.callOnFlip(self.meg.write, 'feedback_message')
+                for _ in range(self._feedback_frames):
+                    self.win.flip()
+                self._feedback_stim.autoDraw = False
 
-                iti = self.rng.uniform(ITI_MIN, ITI_MAX)
-                visual.TextStim(self.win, text="+", color="white", height=0.2, pos=(0, 0)).draw()
-                self.meg.write('fixation') # send trigger
+                iti = itis[trial_num - 1]
+                self._fixation_stim.draw()
+                self.win.callOnFlip(self.meg.write, 'fixation')
                 self.win.flip()
+                self.write_pending_rows()
                 core.wait(iti)
 
             visual.TextStim(self.win, text="End of block. Time to rest.", color="white", height=0.1, pos=(0, .3)).draw()
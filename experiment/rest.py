@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, field
 from psychopy import core, event, visual
 
@@ -21,10 +22,14 @@ class Rest:
     meg: MetaPort = field(init=False)
 
     def __post_init__(self) -> None:
+        # waitBlanking off: this screen shows one static frame and then sits
+        # in core.wait for five minutes, so flips need not block on vsync
         if fullscreen:
-            self.win = visual.Window(color="black", fullscr=True, units="norm", allowGUI=False)
+            self.win = visual.Window(color="black", fullscr=True, units="norm", allowGUI=False,
+                                     waitBlanking=False)
         else:
-            self.win = visual.Window(color="black", size=(WIN_WIDTH, WIN_HEIGHT), units="norm")
+            self.win = visual.Window(color="black", size=(WIN_WIDTH, WIN_HEIGHT), units="norm",
+                                     waitBlanking=False)
 
         # Create MEG trigger object
         self.meg = MetaPort(-1, actual_meg)
@@ -32,6 +37,17 @@ class Rest:
         event.globalKeys.clear()
         event.globalKeys.add(key="escape", func=self._exit)
 
+        # Built once; drawn whenever the photodiode square is needed
+        w, h = self.win.size
+        s = 50  # square size in pixels
+        self._photodiode = visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
+                                       pos=(-w/2 + s/2, -h/2 + s/2))
+
+        # Warm the font atlas so the first real text draw doesn't stall
+        visual.TextStim(self.win, text='A', height=0.1).draw()
+        self.win.flip()
+        self.win.flip()
+
     def _exit(self):
         print("Esc detected: ending experiment...")
         self.close()
@@ -40,21 +56,15 @@ class Rest:
 
     def close(self) -> None:
         """Close open resources."""
+        self.meg.close()
         try:
             self.win.close()
             visual.Window._closeAllWindows()
         except Exception:
             pass
-        try:
-            self.behavior_file.close()
-        except Exception:
-            pass
     
     def draw_photodiode_square(self) -> None:
-        w, h = self.win.size
-        s = 50  # square size in pixels
-        visual.Rect(self.win, width=s, height=s, units='pix', fillColor='white',
-                    pos=(-w/2 + s/2, -h/2 + s/2)).draw()
+        self._photodiode.draw()
 
     def run(self) -> None:
 
@@ -63,8 +73,9 @@ class Rest:
         self.win.flip()
         event.waitKeys(keyList=["space"])
 
+        # Trigger fires from the flip callback, right after the swap
+        self.win.callOnFlip(self.meg.write, 'start_rest')
         self.win.flip()
-        self.meg.write('start_rest') # send trigger
         core.wait(REST_DURATION)
         self.meg.write('end_rest') # send trigger
 
@@ -3,16 +3,19 @@ from __future__ import annotations
 import argparse
 import csv
 import os
+import queue
 import random
+import threading
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from datetime import datetime
 from pathlib import Path
 from typing import Dict
 
-import numpy as np
-import pyglet
+from PIL import Image
 from psychopy import core, event, visual
+from psychopy.hardware import keyboard
 
 from .utils import (
     get_object_mapping,
@@ -20,7 +23,6 @@ from .utils import (
     get_scrambled_pos_and_seq,
     get_scrambling_rule,
     ordinal_string,
-    pos_and_seq_to_state,
 )
 
 # Paths
@@ -49,6 +51,13 @@ N_RUNS = 3
 # N_RUNS = 3
 
 true_state_names = ['W', 'X', 'Y', 'Z', 'Wp', 'Xp', 'Yp', 'Zp']
+# True-order state for a (sequence, position) pair, indexed [seq-1][pos-1]
+POS_SEQ_TO_STATE = (('W', 'X', 'Y', 'Z'), ('Wp', 'Xp', 'Yp', 'Zp'))
+# (stim_number, true_sequence) per state, for the behavior-file columns
+STATE_INFO = {
+    'W': (1, 1), 'X': (2, 1), 'Y': (3, 1), 'Z': (4, 1),
+    'Wp': (5, 2), 'Xp': (6, 2), 'Yp': (7, 2), 'Zp': (8, 2),
+}
 scrambled_positions = [0, 1, 2, 3, 4, 5, 6, 7]
 
 warnings.filterwarnings(
@@ -82,20 +91,30 @@ class StructureLearning:
     behavior_writer: csv.writer = field(init=False)
     scrambling_rule: Dict[str, int] = field(init=False)
     object_mapping: Dict[str, str] = field(init=False)
-    object_stims: Dict[str, visual.ImageStim] = field(init=False)
+    object_stims: Dict[str, Dict[float, visual.ImageStim]] = field(init=False)
     last_probed: tuple[int, int] = field(init=False)
 
     def __post_init__(self) -> None:
         self.scrambling_rule = get_scrambling_rule(self.subject_id)
+        # Inverse rule for O(1) scrambled-position -> state lookups
+        self.inverse_scrambling = {v: k for k, v in self.scrambling_rule.items()}
         self.object_mapping = get_object_mapping(self.subject_id, 'structure_learning')
+        # Presentation order per scrambled sequence, tabulated once: the
+        # scrambling rule is fixed for a subject, so these never change
+        # even when the pictures are reshuffled between runs
+        self._seq_letters = {
+            1: tuple(self.inverse_scrambling[i] for i in range(4)),
+            2: tuple(self.inverse_scrambling[i] for i in range(4, 8)),
+        }
         # self.win = visual.Window(color="black",  size=(WIN_WIDTH, WIN_HEIGHT), units="norm")
         self.win = visual.Window(color="black", size=(1920, 1080), fullscr=True, units="norm", allowGUI=False,)
         event.globalKeys.clear()
         event.globalKeys.add(key="escape", func=self._exit)
 
         # open behavioral data file
-        os.makedirs('behavior_data', exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if not os.path.isdir('behavior_data'):
+            os.makedirs('behavior_data')
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         file_name = f"subject_{self.subject_id}_structure_learning_behavior_{timestamp}.csv"
         self.behavior_filename = os.path.join('behavior_data', file_name)
         self.behavior_file = open(self.behavior_filename, "w", newline="")
@@ -124,28 +143,104 @@ class StructureLearning:
             "reaction_time", 
         ])
 
+        # ptb-backed keyboard: events are timestamped by the backend rather
+        # than by when the polling loop happens to wake up
+        self._kb = keyboard.Keyboard()
+
+        # Sequence presentation is timed in refresh counts so onsets stay
+        # locked to vsync rather than to core.wait's timer
+        self._fps = self.win.getActualFrameRate() or 60
+        self._isi_frames = max(1, int(round(ISI * self._fps)))
+        self._object_frames = max(1, int(round(OBJECT_DURATION * self._fps)))
+        self._iti_frames = max(1, int(round(ITI * self._fps)))
+
         # pre-load images
+        self._decoded_images = {}
         self.preload_images()
         self.last_probed = (-1, -1)
+        # Behavior rows are handed to a worker thread so writerow/flush
+        # never runs on the main thread, mirroring the MetaPort trigger
+        # worker in trigger.py
+        self._row_q = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._csv_worker, daemon=True)
+        self._writer_thread.start()
+        self._text_cache = {}
+        # Built up front: the fixation cross is drawn before every object
+        self.fixation = self.text_stim('+', height=0.3, pos=(0, 0))
+        # The quiz labels never change either, so bind them once instead of
+        # going through the cache key on every trial
+        self._quiz_prompt = self.text_stim('Which comes later in the same true sequence?',
+                                           height=0.07, pos=(0, -.2))
+        self._press_left = self.text_stim('(Press left)', height=0.07, pos=(-.5, -.68))
+        self._press_right = self.text_stim('(Press right)', height=0.07, pos=(.5, -.68))
        
+    def text_stim(self, text: str, **kwargs) -> visual.TextStim:
+        """Return a cached TextStim for this (text, style) combination.
+
+        TextStim construction does font shaping and a texture upload on every
+        call, so the screens reuse one instance per unique label instead of
+        rebuilding it on each draw.
+        """
+        key = (text, tuple(sorted(kwargs.items())))
+        stim = self._text_cache.get(key)
+        if stim is None:
+            stim = visual.TextStim(self.win, text=text, **kwargs)
+            self._text_cache[key] = stim
+        return stim
+
     def preload_images(self) -> None:
         """Helper method to load/reload images"""
+        # Decode unseen images in parallel (PIL releases the GIL in its C
+        # decoder) and keep the decoded copies: a re-permuted mapping reuses
+        # the same eight files, so the between-run reloads skip the decode
+        to_decode = [obj_name for obj_name in self.object_mapping.values()
+                     if obj_name not in self._decoded_images]
+        if to_decode:
+            def _decode(obj_name: str) -> Image.Image:
+                img = Image.open(IMAGES_DIR / f"{obj_name}.png")
+                img.load()
+                return img
+            with ThreadPoolExecutor() as pool:
+                self._decoded_images.update(zip(to_decode, pool.map(_decode, to_decode)))
+        # Two pre-sized stims per letter, for the probe (0.5) and choice
+        # (0.3) displays, so get_object never rebuilds vertices by resizing
         self.object_stims = {}
         for letter, obj_name in self.object_mapping.items():
-            img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[letter] = visual.ImageStim(self.win, image=str(img_path))
+            image = self._decoded_images[obj_name]
+            sized = {}
+            for target in (0.5, 0.3):
+                stim = visual.ImageStim(self.win, image=image)
+                orig_w, orig_h = stim.size
+                s_f = min(target / orig_w, target / orig_h)
+                stim.size = (orig_w * s_f, orig_h * s_f)
+                sized[target] = stim
+            self.object_stims[letter] = sized
+
+        # Draw each stim to the back buffer once and discard it: pyglet
+        # defers the GL texture upload until first draw, which would
+        # otherwise stall the first stimulus of each run
+        for sized in self.object_stims.values():
+            for stim in sized.values():
+                stim.draw()
+        self.win.clearBuffer()
 
     def _exit(self):
         print("Esc detected: ending experiment...")
         self.close()
+        # core.quit() shuts down in order; a hard os._exit here would kill
+        # the CSV writer thread before it finishes draining
         core.quit()
-        os._exit(0)
 
     def close(self) -> None:
         """Close open resources."""
+        try:
+            # Sentinel stops the writer thread after it drains the queue
+            self._row_q.put(None)
+            self._writer_thread.join(timeout=5)
+        except Exception:
+            pass
         try:
             self.win.close()
-            visual.Window._closeAllWindows()
         except Exception:
             pass
         try:
@@ -153,82 +248,108 @@ class StructureLearning:
         except Exception:
             pass
 
+    def _csv_worker(self) -> None:
+        """Drain queued behavior rows to disk off the main thread."""
+        while True:
+            row = self._row_q.get()
+            if row is None:
+                break
+            self.behavior_writer.writerow(row)
+            self.behavior_file.flush()
+
     def get_object(self, true_state: str, size=(0.5, 0.5), pos=(0, 0)) -> visual.ImageStim:
         """Display an image corresponding to the specified object letter (W, X, Y, Z, Wp, Xp, Yp, Zp)."""
-        stim = self.object_stims[true_state]
-        orig_w, orig_h = stim.size
-        s_f = min(size[0] / orig_w, size[1] / orig_h)
-        stim.size = (orig_w * s_f, orig_h * s_f)
+        stim = self.object_stims[true_state][size[0]]
         stim.pos = pos
         return stim
 
     def reverse_state_lookup(self, scrambled_position):
         """ Finds the unscrambled state that maps to scrambled_position. """
-        # Uses reverse dictionary lookup.
-        return [key for key, value in self.scrambling_rule.items() if value == scrambled_position][0]
+        return self.inverse_scrambling[scrambled_position]
 
     def run(self):
         
         def left_right_msg(available_keys: list):
             """ Draw left/right navigation instructions for participants """
             if 'left' in available_keys:
-                visual.TextStim(self.win, text='< left', color='white', height=0.05, pos=(-.9,-.9)).draw()
+                self.text_stim('< left', color='white', height=0.05, pos=(-.9,-.9)).draw()
             if 'space' in available_keys:
-                visual.TextStim(self.win, text='space to continue', color='white', height=0.05, pos=(0,-.9)).draw()
+                self.text_stim('space to continue', color='white', height=0.05, pos=(0,-.9)).draw()
             if 'right' in available_keys:
-                visual.TextStim(self.win, text='right >', color='white', height=0.05, pos=(.9,-.9)).draw()
+                self.text_stim('right >', color='white', height=0.05, pos=(.9,-.9)).draw()
             self.win.flip()
             keys = event.waitKeys(keyList=available_keys + ['escape'])
             return keys
 
+        _screen_bufs = {}
+
+        def static_screen(name: str, stims: list):
+            """Draw a static screen as a single pre-rendered capture.
+
+            The first visit renders the individual stims into a
+            BufferImageStim; later visits blit that one texture instead of
+            issuing a separate GL draw per stim.
+            """
+            buf = _screen_bufs.get(name)
+            if buf is None:
+                buf = _screen_bufs[name] = visual.BufferImageStim(self.win, stim=stims)
+            buf.draw()
+
         def screen1():
-            visual.TextStim(self.win, text='Now, you will apply the rule you learned to unscramble a new set of pictures.', height=0.1, pos=(0,0)).draw()
+            static_screen('screen1', [
+                self.text_stim('Now, you will apply the rule you learned to unscramble a new set of pictures.', height=0.1, pos=(0,0)),
+            ])
 
         def screen2():
-            visual.TextStim(self.win, text='First, you will see the 1st scrambled sequence repeated 3 times in a row.', height=0.1, pos=(0,.5)).draw()
-            visual.TextStim(self.win, text='Then, you will see the 2nd scrambled sequence repeated 3 times in a row.', height=0.1, pos=(0,0)).draw()
-            visual.TextStim(self.win, text='Finally, we will ask quiz questions about the true (unscrambled) order.', height=0.1, pos=(0,-.5)).draw()
-            
+            static_screen('screen2', [
+                self.text_stim('First, you will see the 1st scrambled sequence repeated 3 times in a row.', height=0.1, pos=(0,.5)),
+                self.text_stim('Then, you will see the 2nd scrambled sequence repeated 3 times in a row.', height=0.1, pos=(0,0)),
+                self.text_stim('Finally, we will ask quiz questions about the true (unscrambled) order.', height=0.1, pos=(0,-.5)),
+            ])
+
         def screen3():
-            visual.TextStim(self.win, text='Each question will show one picture at the top, and ' + \
-                'two below, like this. Your task is to say which bottom picture comes after the one at the top, in its true sequence.', height=0.1, pos=(0,.0)).draw()
-            self.get_object(self.reverse_state_lookup(0), size=(0.5,0.5), pos=(0,.5)).draw()
-            self.get_object(self.reverse_state_lookup(1), size=(0.3,0.3), pos=(-.5,-.5)).draw()
-            self.get_object(self.reverse_state_lookup(2), size=(0.3,0.3), pos=(.5,-.5)).draw()
-        
+            static_screen('screen3', [
+                self.text_stim('Each question will show one picture at the top, and ' + \
+                    'two below, like this. Your task is to say which bottom picture comes after the one at the top, in its true sequence.', height=0.1, pos=(0,.0)),
+                self.get_object(self.reverse_state_lookup(0), size=(0.5,0.5), pos=(0,.5)),
+                self.get_object(self.reverse_state_lookup(1), size=(0.3,0.3), pos=(-.5,-.5)),
+                self.get_object(self.reverse_state_lookup(2), size=(0.3,0.3), pos=(.5,-.5)),
+            ])
+
         def screen4():
-            visual.TextStim(self.win, text='This entire process will repeat 3 times.', height=0.1, pos=(0,.5)).draw()
-            visual.TextStim(self.win, text='On each repeat, we will reshuffle the pictures.', height=0.1, pos=(0,0)).draw()
-            visual.TextStim(self.win, text='*Remember, the rule stays the same*', height=0.1, pos=(0,-.5)).draw()
-            
+            static_screen('screen4', [
+                self.text_stim('This entire process will repeat 3 times.', height=0.1, pos=(0,.5)),
+                self.text_stim('On each repeat, we will reshuffle the pictures.', height=0.1, pos=(0,0)),
+                self.text_stim('*Remember, the rule stays the same*', height=0.1, pos=(0,-.5)),
+            ])
+
         def screen5():
-            visual.TextStim(self.win, text='Remember: you can choose one of the two pictures below.', height=0.08, pos=(0,.15)).draw()
-            visual.TextStim(self.win, text='The correct choice is the picture that is *later in the same true sequence* ' + \
-                'as the picture on top.', height=0.08, pos=(0,-.17)).draw()
-            self.get_object(self.reverse_state_lookup(0), size=(0.5,0.5), pos=(0,.5)).draw()
-            self.get_object(self.reverse_state_lookup(1), size=(0.3,0.3), pos=(-.5,-.5)).draw()
-            self.get_object(self.reverse_state_lookup(2), size=(0.3,0.3), pos=(.5,-.5)).draw()
+            static_screen('screen5', [
+                self.text_stim('Remember: you can choose one of the two pictures below.', height=0.08, pos=(0,.15)),
+                self.text_stim('The correct choice is the picture that is *later in the same true sequence* ' + \
+                    'as the picture on top.', height=0.08, pos=(0,-.17)),
+                self.get_object(self.reverse_state_lookup(0), size=(0.5,0.5), pos=(0,.5)),
+                self.get_object(self.reverse_state_lookup(1), size=(0.3,0.3), pos=(-.5,-.5)),
+                self.get_object(self.reverse_state_lookup(2), size=(0.3,0.3), pos=(.5,-.5)),
+            ])
 
         def scrambled_sequences_screen(which_seq: int):
-            if which_seq == 1:
-                sp_list = [0, 1, 2, 3]
-            elif which_seq == 2:
-                sp_list = [4, 5, 6, 7]
-
-            for scrambled_position in sp_list:
+            for state_name in self._seq_letters[which_seq]:
                 # Fixation
-                visual.TextStim(self.win, text='+', height=0.3, pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(ISI)
+                self.fixation.setAutoDraw(True)
+                for _ in range(self._isi_frames):
+                    self.win.flip()
+                self.fixation.setAutoDraw(False)
 
                 # Object
-                state_name = self.reverse_state_lookup(scrambled_position)
-                self.get_object(state_name, size=(0.5,0.5), pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(OBJECT_DURATION)
+                stim = self.get_object(state_name, size=(0.5,0.5), pos=(0,0))
+                stim.setAutoDraw(True)
+                for _ in range(self._object_frames):
+                    self.win.flip()
+                stim.setAutoDraw(False)
 
-            self.win.flip()
-            core.wait(ITI)
+            for _ in range(self._iti_frames):
+                self.win.flip()
 
 
         def quiz_screen(run_number: int):
@@ -241,12 +362,12 @@ class StructureLearning:
                 prob_pos = random.choice([1,2,3])
 
             self.last_probed = (prob_seq, prob_pos)
-            probe_state = pos_and_seq_to_state(pos=prob_pos, seq=prob_seq)
+            probe_state = POS_SEQ_TO_STATE[prob_seq - 1][prob_pos - 1]
 
             # Select the correct choice option
             correct_seq = prob_seq
-            correct_pos = random.choice(range(prob_pos+1,5))
-            correct_state = pos_and_seq_to_state(pos=correct_pos, seq=correct_seq)
+            correct_pos = random.randint(prob_pos + 1, 4)
+            correct_state = POS_SEQ_TO_STATE[correct_seq - 1][correct_pos - 1]
 
             # Select the incorrect choice option
             if prob_pos == 1:
@@ -258,55 +379,53 @@ class StructureLearning:
 
             if incorrect_seq == prob_seq:
                 # if they're in the same sequence, then the incorrect choice must come earlier
-                incorrect_pos = random.choice(range(1,prob_pos))
+                incorrect_pos = random.randint(1, prob_pos - 1)
             else:
                 # if they're in different sequences, then the incorrect choice can come from any position
-                incorrect_pos = random.choice([1,2,3,4])
+                incorrect_pos = random.randint(1, 4)
 
-            incorrect_state = pos_and_seq_to_state(pos=incorrect_pos, seq=incorrect_seq)
+            incorrect_state = POS_SEQ_TO_STATE[incorrect_seq - 1][incorrect_pos - 1]
 
             # Randomly decide whether to put the correct choice on the left side of the screen
             correct_on_left = random.choice([True,False])
+            side = 1 if correct_on_left else -1
 
             # Draw the question
-            visual.TextStim(self.win, text='Which comes later in the same true sequence?', 
-                            height=0.07, pos=(0,-.2)).draw()
+            self._quiz_prompt.draw()
 
             # Draw the probe stimulus
             self.get_object(probe_state, size=(0.5,0.5), pos=(0,.5)).draw()
 
             # Draw the two choices
-            self.get_object(correct_state, size=(0.3,0.3), pos=(-(2*int(correct_on_left)-1)*.5,-.5)).draw()
-            self.get_object(incorrect_state, size=(0.3,0.3), pos=((2*int(correct_on_left)-1)*.5,-.5)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5,-.68)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5,-.68)).draw()
+            self.get_object(correct_state, size=(0.3,0.3), pos=(-side*.5,-.5)).draw()
+            self.get_object(incorrect_state, size=(0.3,0.3), pos=(side*.5,-.5)).draw()
+            self._press_left.draw()
+            self._press_right.draw()
+            # RT clock restarts on the same flip that shows the question
+            self.win.callOnFlip(self._kb.clock.reset)
             self.win.flip()
-            clock = core.Clock()
-            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=clock)
-            key, rt = key_data[0]
+            keys = self._kb.waitKeys(keyList=["left", "right", "escape"], waitRelease=False)
+            key, rt = keys[0].name, keys[0].rt
+            if key == "escape":
+                self._exit()
             sj_correctness = ((key == "left") and correct_on_left) or ((key == "right") and (not correct_on_left))
             chosen_state = correct_state if (key == "left" and correct_on_left or key=="right" and not correct_on_left) else incorrect_state
             chosen_obj = self.object_mapping[chosen_state][1:]
 
-            # State mapping
-            state_map = {'W':1, 'X':2, 'Y':3, 'Z':4, 'Wp':5, 'Xp':6, 'Yp':7, 'Zp':8}
-
             # Probe info
-            probe_stim_number = state_map[probe_state]
-            probe_stim_seq = 1 if probe_stim_number <= 4 else 2
+            probe_stim_number, probe_stim_seq = STATE_INFO[probe_state]
 
             # Correct
             correct_stim_picture = self.object_mapping[correct_state][1:]
-            correct_stim_number = state_map[correct_state]
-            correct_stim_seq = 1 if correct_stim_number <= 4 else 2
+            correct_stim_number, correct_stim_seq = STATE_INFO[correct_state]
 
             # Right
             incorrect_stim_picture = self.object_mapping[incorrect_state][1:]
-            incorrect_stim_number = state_map[incorrect_state]
-            incorrect_stim_seq = 1 if incorrect_stim_number <= 4 else 2
+            incorrect_stim_number, incorrect_stim_seq = STATE_INFO[incorrect_state]
 
-            # Record data to behavior file
-            self.behavior_writer.writerow([
+            # Record data to behavior file; the writer thread does the
+            # actual disk I/O so this put returns immediately
+            self._row_q.put([
                 self.subject_id,
                 run_number + 1,  # Add 1 to make it 1-indexed (1, 2, 3) instead of 0-indexed
                 self.object_mapping[probe_state][1:],  # probe_picture
@@ -328,7 +447,6 @@ class StructureLearning:
                 int(sj_correctness),
                 rt,
             ])
-            self.behavior_file.flush()
 
         ####################### Do the intro
 
@@ -347,7 +465,7 @@ class StructureLearning:
                 done = True
             elif keys[0] == 'right':
                 screen_ix += 1
-            screen_ix = np.maximum(np.minimum(screen_ix, len(intro_screens)-1), 0)
+            screen_ix = max(0, min(screen_ix, len(intro_screens) - 1))
 
         ####################### Do the structure learning task
 
@@ -371,11 +489,11 @@ class StructureLearning:
             # Quiz phase
             for probe_ix in range(40):
                 quiz_screen(run_number=run)  # Pass run number to quiz_screen
-                self.win.flip()
-                core.wait(ISI)
+                for _ in range(self._isi_frames):
+                    self.win.flip()
 
-        visual.TextStim(self.win, text="All done.", height=0.1, pos=(0,0.0)).draw()
-        visual.TextStim(self.win, text="Press space to exit", height=0.07, pos=(0,-0.5)).draw()
+        self.text_stim("All done.", height=0.1, pos=(0,0.0)).draw()
+        self.text_stim("Press space to exit", height=0.07, pos=(0,-0.5)).draw()
         self.win.flip()
         event.waitKeys(keyList=['space'])
 
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
 import argparse
-import numpy as np
 import csv
 import os
 import random
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
 
+from PIL import Image
+from pyglet.window import key as pyglet_key
 from psychopy import core, event, visual
 
 from .utils import (
@@ -48,7 +50,13 @@ ITI = 1.5
 true_state_names = ['W', 'X', 'Y', 'Z', 'Wp', 'Xp', 'Yp', 'Zp']
 scrambled_positions = [0, 1, 2, 3, 4, 5, 6, 7]
 state_map = {'W': 1, 'X': 2, 'Y': 3, 'Z': 4, 'Wp': 5, 'Xp': 6, 'Yp': 7, 'Zp': 8}
+# States grouped by true sequence, so the training loop doesn't re-derive
+# get_pos_and_seq(s)[1] for every state on every iteration
+seq_to_states = {seq: [s for s in true_state_names if get_pos_and_seq(s)[1] == seq]
+                 for seq in (1, 2)}
 nseq = len(scrambled_positions)
+# Intro navigation: how each accepted key moves the screen index
+key_delta = {'left': -1, 'right': +1, 'space': 0, 'escape': 0}
 
 warnings.filterwarnings(
     "ignore",
@@ -77,12 +85,37 @@ class Training:
         # Load rule & mapping for TRAINING phase
         self.scrambling_rule = get_scrambling_rule(self.subject_id)
         self.inv_scrambling_rule = {v: k for k, v in self.scrambling_rule.items()}
+        # Presentation order of the two scrambled sequences, resolved once so
+        # the display loops don't do a reverse lookup per position
+        self._scrambled_seq_states = (
+            [self.inv_scrambling_rule[p] for p in (0, 1, 2, 3)],
+            [self.inv_scrambling_rule[p] for p in (4, 5, 6, 7)],
+        )
+
+        # Rule-reminder and quiz strings, concatenated once up front so the
+        # incorrect-answer branches don't rebuild them mid-trial
+        self._rule_feedback_text = {}
+        for state in self.scrambling_rule:
+            pos, seq = get_pos_and_seq(state)
+            s_pos, s_seq = get_scrambled_pos_and_seq(self.scrambling_rule[state])
+            self._rule_feedback_text[state] = (
+                'The ' + ordinal_string(s_pos) + ' picture in the ' + ordinal_string(s_seq) +
+                ' scrambled sequence is the ' + ordinal_string(pos) + ' picture of the ' +
+                ordinal_string(seq) + ' true sequence.')
+        self._order_quiz_title = {
+            seq: 'Which comes later in the ' + ordinal_string(seq) + ' true sequence?'
+            for seq in (1, 2)}
         self.object_mapping = get_object_mapping(self.subject_id, 'training')
         self.win = visual.Window(color="black",  size=(WIN_WIDTH, WIN_HEIGHT), units="norm")
         self.win = visual.Window(color="black", size=(1920, 1080), fullscr=True, units="norm", allowGUI=False,)
         event.globalKeys.clear()
         event.globalKeys.add(key="escape", func=self._exit)
 
+        # Event-driven key capture: register one pyglet handler up front so
+        # waits only pump the window's event queue (see wait_for_key)
+        self._last_key = None
+        self.win.winHandle.push_handlers(on_key_press=self._on_key_press)
+
         # Behaviour file
         BEHAVIOR_DIR.mkdir(exist_ok=True, parents=True)
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -113,8 +146,67 @@ class Training:
 
         # Deterministic RNG per participant
         self.rng = random.Random(self.subject_id)
+        self._text_cache = {}
+        self._decoded_images = {}
+        # Reusable key lists and flip timestamp for the navigation screens
+        self._keylists = {}
+        self._log = []
+        self._flip_time = 0.0
         self.preload_images()
 
+    def text_stim(self, text: str, **kwargs) -> visual.TextStim:
+        """Return a cached TextStim for this (text, style) combination.
+
+        TextStim construction does font shaping and a texture upload on every
+        call, so the interactive screens reuse one instance per unique label
+        instead of rebuilding it on each draw.
+        """
+        key = (text, tuple(sorted(kwargs.items())))
+        stim = self._text_cache.get(key)
+        if stim is None:
+            stim = visual.TextStim(self.win, text=text, **kwargs)
+            self._text_cache[key] = stim
+        return stim
+
+    def _on_key_press(self, symbol, modifiers):
+        """pyglet handler: timestamp each keypress as it is dispatched."""
+        self._last_key = (pyglet_key.symbol_string(symbol).lower(), core.getTime())
+
+    def wait_for_key(self, accepted) -> tuple:
+        """Event-driven replacement for event.waitKeys.
+
+        The on_key_press handler registered at startup records (name, time)
+        inside the event callback itself, so no key-filter list is rebuilt
+        per call and the timestamp is taken before any Python-level polling
+        resumes. Returns (key_name, press_time) for the first accepted key.
+        """
+        win_handle = self.win.winHandle
+        # Drain presses made while the event loop wasn't being pumped (e.g.
+        # during a feedback core.wait) before arming the handler, so a stale
+        # press can't be accepted with a bogus near-zero RT
+        win_handle.dispatch_events()
+        self._last_key = None
+        while True:
+            win_handle.dispatch_events()
+            pressed = self._last_key
+            if pressed is not None:
+                if pressed[0] in accepted:
+                    return pressed
+                self._last_key = None
+            core.wait(0.001, hogCPUperiod=0)
+
+    def log(self, msg: str) -> None:
+        """Buffer a debug message instead of printing mid-loop.
+
+        print() flushes stdout and can block for milliseconds right before a
+        flip; buffered messages are written out once in close().
+        """
+        self._log.append((core.getTime(), msg))
+
+    def _mark_flip(self):
+        """callOnFlip hook: record the time at which the flip completed."""
+        self._flip_time = core.getTime()
+
     def _exit(self):
         print("Esc detected: ending experiment...")
         self.close()
@@ -123,10 +215,21 @@ class Training:
 
     def preload_images(self) -> None:
         """Preload images for the current mapping into PsychoPy stimuli cache."""
+        # Decode unseen images in parallel (PIL releases the GIL in its C
+        # decoder) and keep the decoded copies: a re-permuted mapping reuses
+        # the same eight files, so later reloads skip the decode entirely.
+        to_decode = [obj_name for obj_name in self.object_mapping.values()
+                     if obj_name not in self._decoded_images]
+        if to_decode:
+            def _decode(obj_name: str) -> Image.Image:
+                img = Image.open(IMAGES_DIR / f"{obj_name}.png")
+                img.load()
+                return img
+            with ThreadPoolExecutor() as pool:
+                self._decoded_images.update(zip(to_decode, pool.map(_decode, to_decode)))
         self.object_stims = {}
         for letter, obj_name in self.object_mapping.items():
-            img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[letter] = visual.ImageStim(self.win, image=str(img_path))
+            self.object_stims[letter] = visual.ImageStim(self.win, image=self._decoded_images[obj_name])
 
     def close(self) -> None:
         """Close open resources."""
@@ -139,6 +242,10 @@ class Training:
             self.behavior_file.close()
         except Exception:
             pass
+        if self._log:
+            for t, msg in self._log:
+                print(f"{t:.3f} {msg}")
+            self._log = []
 
     def get_object(self, true_state: str, size=(0.5, 0.5), pos=(0, 0)) -> visual.ImageStim:
         """Display an image corresponding to the specified object letter (W, X, Y, Z, Wp, Xp, Yp, Zp)."""
@@ -165,22 +272,47 @@ class Training:
         def left_right_msg(available_keys: list):
             """ Draw left/right/space navigation instructions for participants """
             if 'left' in available_keys:
-                visual.TextStim(self.win, text='< left', color='white', height=0.05, pos=(-.9, -.9)).draw()
+                self.text_stim('< left', color='white', height=0.05, pos=(-.9, -.9)).draw()
             if 'space' in available_keys:
-                visual.TextStim(self.win, text='Press space to continue', color='white', height=0.05, pos=(0, -.9)).draw()
+                self.text_stim('Press space to continue', color='white', height=0.05, pos=(0, -.9)).draw()
             if 'right' in available_keys:
-                visual.TextStim(self.win, text='right >', color='white', height=0.05, pos=(.9, -.9)).draw()
+                self.text_stim('right >', color='white', height=0.05, pos=(.9, -.9)).draw()
+            keylist = self._keylists.get(tuple(available_keys))
+            if keylist is None:
+                # Immutable so nothing downstream can mutate the cached entry
+                keylist = self._keylists[tuple(available_keys)] = tuple(available_keys) + ('escape',)
+            # Timestamp the flip itself, then go straight into waitKeys so no
+            # Python work sits between stimulus onset and key polling
+            self.win.callOnFlip(self._mark_flip)
             self.win.flip()
-            keys = event.waitKeys(keyList=available_keys + ['escape'])
-            return keys
+            key, _ = self.wait_for_key(keylist)
+            return [key]
 
         # INTRO SCREENS (unchanged)
+        _screen_bufs = {}
+
+        def static_screen(name: str, stims: list):
+            """Draw a static screen as a single pre-rendered capture.
+
+            The first visit renders the individual stims into a
+            BufferImageStim; later visits blit that one texture instead of
+            issuing a separate GL draw per stim.
+            """
+            buf = _screen_bufs.get(name)
+            if buf is None:
+                buf = _screen_bufs[name] = visual.BufferImageStim(self.win, stim=stims)
+            buf.draw()
+
         def screen1():
-            visual.TextStim(self.win, text="Today's goal is to learn a rule that will unscramble two sequences of pictures.", height=0.1, pos=(0, 0)).draw()
+            static_screen('screen1', [
+                self.text_stim("Today's goal is to learn a rule that will unscramble two sequences of pictures.", height=0.1, pos=(0, 0)),
+            ])
             return ['right']
 
         def screen2():
-            visual.TextStim(self.win, text='You will see two scrambled sequences like this...', height=0.1, pos=(0, 0)).draw()
+            static_screen('screen2', [
+                self.text_stim('You will see two scrambled sequences like this...', height=0.1, pos=(0, 0)),
+            ])
             return ['left', 'right']
 
         def screen3():
@@ -188,34 +320,36 @@ class Training:
             return ['left', 'right']
 
         def screen4():
-            visual.TextStim(self.win, text='Then you will have to answer questions, like: does ' + self.object_mapping['W'][1:] +
-                            ' come before or after ' + self.object_mapping['X'][1:] + '?', height=0.1, pos=(0, .6)).draw()
-            visual.TextStim(self.win, text='But the questions will be about the unscrambled order, not the order you saw.', height=0.1, pos=(0, 0), bold=True).draw()
-            visual.TextStim(self.win, text="So you'll have to mentally reorder the sequences to answer these questions.", height=0.1, pos=(0, -.5)).draw()
+            static_screen('screen4', [
+                self.text_stim('Then you will have to answer questions, like: does ' + self.object_mapping['W'][1:] +
+                               ' come before or after ' + self.object_mapping['X'][1:] + '?', height=0.1, pos=(0, .6)),
+                self.text_stim('But the questions will be about the unscrambled order, not the order you saw.', height=0.1, pos=(0, 0), bold=True),
+                self.text_stim("So you'll have to mentally reorder the sequences to answer these questions.", height=0.1, pos=(0, -.5)),
+            ])
             return ['left', 'right']
 
         def screen5():
-            visual.TextStim(self.win, text='Here is the rule. We will help you learn it today.', height=0.12, pos=(0, .7), bold=True).draw()
-
             name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
             ss_1 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4)])
             ss_2 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)])
 
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.1, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text=ss_1, height=0.12, pos=(0, .3)).draw()
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
-            visual.TextStim(self.win, text=ss_2, height=0.12, pos=(0, .1)).draw()
-
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.1, pos=(0, -.2)).draw()
-            visual.TextStim(self.win, text='A-B-C-D', height=0.12, pos=(0, -.3)).draw()
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
-            visual.TextStim(self.win, text='1-2-3-4', height=0.12, pos=(0, -.5)).draw()
+            static_screen('screen5', [
+                self.text_stim('Here is the rule. We will help you learn it today.', height=0.12, pos=(0, .7), bold=True),
+                self.text_stim('Scrambled sequence 1: ', height=0.1, pos=(0, .4)),
+                self.text_stim(ss_1, height=0.12, pos=(0, .3)),
+                self.text_stim('Scrambled sequence 2: ', height=0.1, pos=(0, .2)),
+                self.text_stim(ss_2, height=0.12, pos=(0, .1)),
+                self.text_stim('True sequence 1: ', height=0.1, pos=(0, -.2)),
+                self.text_stim('A-B-C-D', height=0.12, pos=(0, -.3)),
+                self.text_stim('True sequence 2: ', height=0.1, pos=(0, -.4)),
+                self.text_stim('1-2-3-4', height=0.12, pos=(0, -.5)),
+            ])
             return ['left', 'right']
 
         def screen6():
-            visual.TextStim(self.win, text='Tomorrow, you will apply the same rule to unscramble new sequences of pictures.', height=0.1, pos=(0, .5)).draw()
-            visual.TextStim(self.win, text="You will earn points by applying today's rule to tomorrow's pictures.", height=0.1, pos=(0, .05)).draw()
-            visual.TextStim(self.win, text="So it's really important to learn the rule today.", height=0.1, pos=(0, -.35)).draw()
+            self.text_stim('Tomorrow, you will apply the same rule to unscramble new sequences of pictures.', height=0.1, pos=(0, .5)).draw()
+            self.text_stim("You will earn points by applying today's rule to tomorrow's pictures.", height=0.1, pos=(0, .05)).draw()
+            self.text_stim("So it's really important to learn the rule today.", height=0.1, pos=(0, -.35)).draw()
             return ['left', 'space']
 
         # Rules
@@ -225,31 +359,31 @@ class Training:
             ss_1 = [name_mapping[self.reverse_state_lookup(i)] for i in range(4)]
             ss_2 = [name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)]
 
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.07, pos=(-.67, .8)).draw()
+            self.text_stim('Scrambled sequence 1: ', height=0.07, pos=(-.67, .8)).draw()
             for i, s in enumerate(ss_1):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(-.32 + i * 0.09, .8)).draw()
+                self.text_stim(s, height=0.12, pos=(-.32 + i * 0.09, .8)).draw()
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(-.28 + i * 0.09, .8)).draw()
+                self.text_stim('-', height=0.12, pos=(-.28 + i * 0.09, .8)).draw()
 
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.07, pos=(-.67, .65)).draw()
+            self.text_stim('Scrambled sequence 2: ', height=0.07, pos=(-.67, .65)).draw()
             for i, s in enumerate(ss_2):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(-.32 + i * 0.09, .65)).draw()
+                self.text_stim(s, height=0.12, pos=(-.32 + i * 0.09, .65)).draw()
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(-.28 + i * 0.09, .65)).draw()
+                self.text_stim('-', height=0.12, pos=(-.28 + i * 0.09, .65)).draw()
 
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.07, pos=(.37, .8)).draw()
+            self.text_stim('True sequence 1: ', height=0.07, pos=(.37, .8)).draw()
             for i, s in enumerate(['A', 'B', 'C', 'D']):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(.62 + i * 0.09, .8)).draw()
+                self.text_stim(s, height=0.12, pos=(.62 + i * 0.09, .8)).draw()
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(.66 + i * 0.09, .8)).draw()
+                self.text_stim('-', height=0.12, pos=(.66 + i * 0.09, .8)).draw()
 
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.07, pos=(.37, .65)).draw()
+            self.text_stim('True sequence 2: ', height=0.07, pos=(.37, .65)).draw()
             for i, s in enumerate(['1', '2', '3', '4']):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(.62 + i * 0.09, .65)).draw()
+                self.text_stim(s, height=0.12, pos=(.62 + i * 0.09, .65)).draw()
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(.66 + i * 0.09, .65)).draw()
+                self.text_stim('-', height=0.12, pos=(.66 + i * 0.09, .65)).draw()
 
-            visual.TextStim(self.win, text="Let's focus on this part of the rule:", height=0.1, pos=(0, .2)).draw()
+            self.text_stim("Let's focus on this part of the rule:", height=0.1, pos=(0, .2)).draw()
 
             pos, seq = get_pos_and_seq(true_state)
             s_pos, s_seq = get_scrambled_pos_and_seq(self.scrambling_rule[true_state])
@@ -268,13 +402,8 @@ class Training:
                 lineColor='red', lineWidth=3, fillColor=None
             ).draw()
 
-            visual.TextStim(
-                self.win,
-                text='The ' + ordinal_string(s_pos) + ' picture in the ' + ordinal_string(s_seq) +
-                     ' scrambled sequence is the ' + ordinal_string(pos) + ' picture of the ' +
-                     ordinal_string(seq) + ' true sequence.',
-                height=0.1, pos=(0, -.2)
-            ).draw()
+            self.text_stim(self._rule_feedback_text[true_state],
+                           height=0.1, pos=(0, -.2)).draw()
 
         def scrambled_sequences_screen():
             """
@@ -284,19 +413,18 @@ class Training:
             self.win.flip()
             
             # Show sequence 1 title, then wait briefly
-            visual.TextStim(self.win, text='Scrambled sequence 1', height=0.12, pos=(0,0)).draw()
+            self.text_stim('Scrambled sequence 1', height=0.12, pos=(0,0)).draw()
             self.win.flip()
-            core.wait(1)  # Brief pause to read title
+            core.wait(1, hogCPUperiod=0)  # Reading pause: sleep instead of busy-waiting
             
             # Sequence 1: positions [0..3] with fixation before each stimulus
-            for scrambled_position in [0, 1, 2, 3]:
+            for state_name in self._scrambled_seq_states[0]:
                 # Fixation cross (no sequence title)
-                visual.TextStim(self.win, text='+', color='white', height=0.3, pos=(0,0)).draw()
+                self.text_stim('+', color='white', height=0.3, pos=(0,0)).draw()
                 self.win.flip()
                 core.wait(ISI)
 
                 # Show stimulus
-                state_name = self.reverse_state_lookup(scrambled_position)
                 self.get_object(state_name, size=(0.5, 0.5), pos=(0,0)).draw()
                 self.win.flip()
                 core.wait(OBJECT_DURATION)
@@ -306,19 +434,18 @@ class Training:
             core.wait(ISI)
 
             # Show sequence 2 title, then wait briefly  
-            visual.TextStim(self.win, text='Scrambled sequence 2', height=0.12, pos=(0,0)).draw()
+            self.text_stim('Scrambled sequence 2', height=0.12, pos=(0,0)).draw()
             self.win.flip()
-            core.wait(1)  # Brief pause to read title
+            core.wait(1, hogCPUperiod=0)  # Reading pause: sleep instead of busy-waiting
 
             # Sequence 2: positions [4..7] with fixation before each stimulus
-            for scrambled_position in [4, 5, 6, 7]:
+            for state_name in self._scrambled_seq_states[1]:
                 # Fixation cross (no sequence title)
-                visual.TextStim(self.win, text='+', color='white', height=0.3, pos=(0,0)).draw()
+                self.text_stim('+', color='white', height=0.3, pos=(0,0)).draw()
                 self.win.flip()
                 core.wait(ISI)
 
                 # Show stimulus
-                state_name = self.reverse_state_lookup(scrambled_position)
                 self.get_object(state_name, size=(0.5, 0.5), pos=(0,0)).draw()
                 self.win.flip()
                 core.wait(OBJECT_DURATION)
@@ -336,22 +463,24 @@ class Training:
             stim_number = state_map[true_state]
             stim_seq = 1 if true_state in ['W', 'X', 'Y', 'Z'] else 2
 
-            visual.TextStim(self.win, text='Which sequence does', height=0.1, pos=(0, .7)).draw()
+            self.text_stim('Which sequence does', height=0.1, pos=(0, .7)).draw()
             self.get_object(true_state, size=(0.3, 0.3), pos=(0, .5)).draw()
-            visual.TextStim(self.win, text='belong to?', height=0.1, pos=(0, .3)).draw()
+            self.text_stim('belong to?', height=0.1, pos=(0, .3)).draw()
 
             true_pos, true_seq = get_pos_and_seq(true_state)
 
             # Draw the two choices
-            visual.TextStim(self.win, text='Sequence 1', height=0.1, pos=(-.5, -.45)).draw()
-            visual.TextStim(self.win, text='Sequence 2', height=0.1, pos=(.5, -.45)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5, -.6)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5, -.6)).draw()
+            self.text_stim('Sequence 1', height=0.1, pos=(-.5, -.45)).draw()
+            self.text_stim('Sequence 2', height=0.1, pos=(.5, -.45)).draw()
+            self.text_stim('(Press left)', height=0.07, pos=(-.5, -.6)).draw()
+            self.text_stim('(Press right)', height=0.07, pos=(.5, -.6)).draw()
             
+            # RT runs from the flip-callback timestamp to the key-event
+            # timestamp, so neither endpoint depends on when Python resumes
+            self.win.callOnFlip(self._mark_flip)
             self.win.flip()
-            clock = core.Clock()
-            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=clock)
-            key, rt = key_data[0]
+            key, t_press = self.wait_for_key(("left", "right", "escape"))
+            rt = t_press - self._flip_time
             
             if key == "escape":
                 return "escape"
@@ -360,15 +489,15 @@ class Training:
             correct_bool = ((key == "left") and (true_seq == 1)) or ((key == "right") and (true_seq == 2))
             
             if correct_bool:
-                visual.TextStim(self.win, text="Correct!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Correct!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
-                core.wait(MESSAGE_DURATION)
+                core.wait(MESSAGE_DURATION, hogCPUperiod=0)
                 result = "correct"
             else:
                 # SIMPLIFIED: Just show "Incorrect!" without the explanation
-                visual.TextStim(self.win, text="Incorrect!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Incorrect!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
-                core.wait(MESSAGE_DURATION)
+                core.wait(MESSAGE_DURATION, hogCPUperiod=0)
                 result = "incorrect"
 
             choice_stim_seq = chosen_seq
@@ -409,19 +538,21 @@ class Training:
             true_pos_2, true_seq_2 = get_pos_and_seq(true_state_2)
             assert true_seq_1 == true_seq_2, 'ERROR: Can only compare order within one true sequence'
 
-            visual.TextStim(self.win, text='Which comes later in the ' + ordinal_string(true_seq_1) + ' true sequence?',
+            self.text_stim(self._order_quiz_title[true_seq_1],
                             height=0.1, pos=(0, .4)).draw()
 
             # Draw the two choices
             self.get_object(true_state_1, size=(0.3, 0.3), pos=(-.5, -.4)).draw()
             self.get_object(true_state_2, size=(0.3, 0.3), pos=(.5, -.4)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5, -.7)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5, -.7)).draw()
+            self.text_stim('(Press left)', height=0.07, pos=(-.5, -.7)).draw()
+            self.text_stim('(Press right)', height=0.07, pos=(.5, -.7)).draw()
             
+            # RT runs from the flip-callback timestamp to the key-event
+            # timestamp, so neither endpoint depends on when Python resumes
+            self.win.callOnFlip(self._mark_flip)
             self.win.flip()
-            clock = core.Clock()
-            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=clock)
-            key, rt = key_data[0]
+            key, t_press = self.wait_for_key(("left", "right", "escape"))
+            rt = t_press - self._flip_time
             
             if key == "escape":
                 return "escape"
@@ -433,15 +564,15 @@ class Training:
             correct_bool = ((key == "left") and (not first_on_left)) or ((key == "right") and first_on_left)
             
             if correct_bool:
-                visual.TextStim(self.win, text="Correct!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Correct!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
-                core.wait(MESSAGE_DURATION)
+                core.wait(MESSAGE_DURATION, hogCPUperiod=0)
                 result = "correct"
             else:
                 # SIMPLIFIED: Just show "Incorrect!" without the explanation
-                visual.TextStim(self.win, text="Incorrect!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Incorrect!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
-                core.wait(MESSAGE_DURATION)
+                core.wait(MESSAGE_DURATION, hogCPUperiod=0)
                 result = "incorrect"
 
             l_stim_number = state_map[true_state_1]
@@ -497,7 +628,7 @@ class Training:
                 scrambled_sequences_screen()
                 retry_count += 1
             
-            print(f"Warning: Maximum retries exceeded for sequence quiz on state {true_state}")
+            self.log(f"Warning: Maximum retries exceeded for sequence quiz on state {true_state}")
             return result
 
         def order_quiz_screen(true_state_1: str, true_state_2: str):
@@ -519,12 +650,12 @@ class Training:
                 scrambled_sequences_screen()
                 retry_count += 1
             
-            print(f"Warning: Maximum retries exceeded for order quiz on states {true_state_1}, {true_state_2}")
+            self.log(f"Warning: Maximum retries exceeded for order quiz on states {true_state_1}, {true_state_2}")
             return result
 
         def show_full_rule_screen():
             """Show the full rule with letters/numbers (no images)."""
-            visual.TextStim(self.win, text="Now, we will quiz you about any part of this rule.", height=0.1, pos=(0, .7)).draw()
+            self.text_stim("Now, we will quiz you about any part of this rule.", height=0.1, pos=(0, .7)).draw()
 
             name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
             
@@ -532,18 +663,18 @@ class Training:
             ss_1 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4)])
             ss_2 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)])
             
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.1, pos=(0, .5)).draw()
-            visual.TextStim(self.win, text=ss_1, height=0.12, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
-            visual.TextStim(self.win, text=ss_2, height=0.12, pos=(0, .1)).draw()
+            self.text_stim('Scrambled sequence 1: ', height=0.1, pos=(0, .5)).draw()
+            self.text_stim(ss_1, height=0.12, pos=(0, .4)).draw()
+            self.text_stim('Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
+            self.text_stim(ss_2, height=0.12, pos=(0, .1)).draw()
             
             # True sequences
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.1, pos=(0, -.1)).draw()
-            visual.TextStim(self.win, text='A-B-C-D', height=0.12, pos=(0, -.2)).draw()
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
-            visual.TextStim(self.win, text='1-2-3-4', height=0.12, pos=(0, -.5)).draw()
+            self.text_stim('True sequence 1: ', height=0.1, pos=(0, -.1)).draw()
+            self.text_stim('A-B-C-D', height=0.12, pos=(0, -.2)).draw()
+            self.text_stim('True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
+            self.text_stim('1-2-3-4', height=0.12, pos=(0, -.5)).draw()
             
-            visual.TextStim(self.win, text="Press space to continue", height=0.05, pos=(0, -.9)).draw()
+            self.text_stim("Press space to continue", height=0.05, pos=(0, -.9)).draw()
 
         def mixed_quiz_block(n: int = 8):
             """
@@ -571,40 +702,53 @@ class Training:
         # ================= MAIN TRAINING FLOW =================
         
         # Intro navigator
-        intro_screens = [screen1, screen2, screen3, screen4, screen5, screen6]
+        intro_screens = (screen1, screen2, screen3, screen4, screen5, screen6)
         screen_ix, done_intro = 0, False
         while not done_intro:
             available_keys = intro_screens[screen_ix]()
-            keys = left_right_msg(available_keys)
-            k = keys[0]
-            if k == 'left':
-                screen_ix = max(screen_ix - 1, 0)
-            elif k == 'right':
-                screen_ix = min(screen_ix + 1, len(intro_screens) - 1)
-            elif k == 'space':
+            k = left_right_msg(available_keys)[0]
+            if k == 'space':
                 done_intro = True
             elif k == 'escape':
                 self.close()
                 core.quit()
-            screen_ix = np.maximum(np.minimum(screen_ix, len(intro_screens)-1), 0)
+            screen_ix = max(0, min(len(intro_screens) - 1, screen_ix + key_delta[k]))
         
+        # Learning levels with buckets keyed by level, kept in sync on every
+        # update so level queries are bucket reads instead of dict scans
         learning_levels = {state: 0 for state in true_state_names}
-        
-        def states_at_level(dict_of_levels, level: int):
-            return [k for k, v in dict_of_levels.items() if v == level]
+        level_buckets = {0: set(true_state_names)}
+
+        def set_level(state, new_level: int):
+            old_level = learning_levels[state]
+            if new_level != old_level:
+                level_buckets[old_level].discard(state)
+                level_buckets.setdefault(new_level, set()).add(state)
+                learning_levels[state] = new_level
+
+        def lowest_level():
+            return min(lvl for lvl, bucket in level_buckets.items() if bucket)
+
+        def states_at_level(level: int):
+            # state_map order matches the old dict-scan order, keeping
+            # self.rng.choice reproducible
+            return sorted(level_buckets.get(level, ()), key=state_map.get)
 
-        def states_above_level(dict_of_levels, level: int):
-            return [k for k, v in dict_of_levels.items() if v > level]
+        def states_above_level(level: int):
+            # Flatten first, sort once: the old dict scan returned states in
+            # state_map order regardless of level
+            return sorted((s for lvl, bucket in level_buckets.items() if lvl > level
+                           for s in bucket), key=state_map.get)
 
         N_SHUFFLES = 3
         for shuffle_idx in range(N_SHUFFLES):
             if shuffle_idx > 0:
                 # Inform about reshuffle; RULE stays the same
-                visual.TextStim(self.win, text='We are going to reshuffle the pictures.', height=0.1, pos=(0, .5)).draw()
-                visual.TextStim(self.win, text='The rule stays the same.', height=0.1, pos=(0, .2)).draw()
-                visual.TextStim(self.win, text=('Remember, focus on learning the rule, because tomorrow '
+                self.text_stim('We are going to reshuffle the pictures.', height=0.1, pos=(0, .5)).draw()
+                self.text_stim('The rule stays the same.', height=0.1, pos=(0, .2)).draw()
+                self.text_stim(('Remember, focus on learning the rule, because tomorrow '
                                                 'you will have to work with a whole new set of pictures.'), height=0.1, pos=(0, -.2)).draw()
-                visual.TextStim(self.win, text="Press space to continue", height=0.05, pos=(0, -.9)).draw()
+                self.text_stim("Press space to continue", height=0.05, pos=(0, -.9)).draw()
                 self.win.flip()
                 event.waitKeys(keyList=["space"])
                 # New mapping for training (rule unchanged)
@@ -612,14 +756,15 @@ class Training:
                 self.preload_images()
 
             # Reset learning levels for this shuffle
-            learning_levels = {state: 0 for state in true_state_names}
+            for state in true_state_names:
+                set_level(state, 0)
 
             # Keep training while any states are below max proficiency level
-            current_lowest_level = min(learning_levels.values())
+            current_lowest_level = lowest_level()
             while current_lowest_level < 1:
 
                 # Train a state from the least-learned tier
-                true_state = self.rng.choice(states_at_level(learning_levels, current_lowest_level))
+                true_state = self.rng.choice(states_at_level(current_lowest_level))
                 pos, seq = get_pos_and_seq(true_state)
 
                 # Focused rule reminder + sequence observation
@@ -638,8 +783,8 @@ class Training:
                 # If there's another state above level-0 in this sequence, also do an ORDER quiz
                 quiz_result_2 = 'correct'
                 true_state_2 = None
-                states_in_same_seq = [s for s in states_above_level(learning_levels, 0) if
-                                      (seq == get_pos_and_seq(s)[1] and s != true_state)]
+                states_in_same_seq = [s for s in states_above_level(0) if
+                                      (s in seq_to_states[seq] and s != true_state)]
                 if states_in_same_seq:
                     true_state_2 = self.rng.choice(states_in_same_seq)
                     quiz_result_2 = order_quiz_screen(true_state_1=true_state, true_state_2=true_state_2)
@@ -651,15 +796,15 @@ class Training:
 
                 # Update learning levels based on performance
                 if quiz_result == 'correct' and quiz_result_2 == 'correct':
-                    learning_levels[true_state] += 1
+                    set_level(true_state, learning_levels[true_state] + 1)
                 else:
                     # Do not allow learning level to drop below 1
                     if learning_levels[true_state] > 1:
-                        learning_levels[true_state] -= 1
+                        set_level(true_state, learning_levels[true_state] - 1)
                     if true_state_2 and learning_levels[true_state_2] > 1:
-                        learning_levels[true_state_2] -= 1
+                        set_level(true_state_2, learning_levels[true_state_2] - 1)
 
-                current_lowest_level = min(learning_levels.values())
+                current_lowest_level = lowest_level()
 
             # Mastery reached for this shuffle: show full rule then mixed quiz
             show_full_rule_screen()
@@ -672,8 +817,8 @@ class Training:
                 return
 
         # End-of-session screen
-        visual.TextStim(self.win, text="All done. Great job.", height=0.1, pos=(0, 0.0)).draw()
-        visual.TextStim(self.win, text="Press space to exit", height=0.07, pos=(0, -0.5)).draw()
+        self.text_stim("All done. Great job.", height=0.1, pos=(0, 0.0)).draw()
+        self.text_stim("Press space to exit", height=0.07, pos=(0, -0.5)).draw()
         self.win.flip()
         event.waitKeys(keyList=["space"])
         self.close()
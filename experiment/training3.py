@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import argparse
-import numpy as np
 import csv
 import os
 import random
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 from itertools import combinations
 from pathlib import Path
 from typing import Dict
 
+import pyglet
+# Every GL call otherwise pays a glGetError round-trip; drop the dev-time
+# error surfacing before psychopy creates the window
+pyglet.options['debug_gl'] = False
+
+from PIL import Image
 from psychopy import core, event, visual
 
 from .utils import (
@@ -59,7 +65,7 @@ warnings.filterwarnings(
     module=r"psychopy\.visual\.shape"
 )
 
-@dataclass
+@dataclass(slots=True)
 class Training:
     """
     Teaches participants the unscrambling rule before beginning Structure Learning.
@@ -74,6 +80,25 @@ class Training:
     object_mapping: Dict[str, str] = field(init=False)
     object_stims: Dict[str, visual.ImageStim] = field(init=False)
     rng: random.Random = field(init=False)
+    _text_cache: dict = field(init=False)
+    _rows_buffer: list = field(init=False)
+    _decoded_images: dict = field(init=False)
+    _name_mapping: Dict[str, str] = field(init=False)
+    _ss1_chars: list = field(init=False)
+    _ss2_chars: list = field(init=False)
+    _ss1_text: str = field(init=False)
+    _ss2_text: str = field(init=False)
+    _order_quiz_title: Dict[int, str] = field(init=False)
+    _highlight_scrambled: visual.Circle = field(init=False)
+    _highlight_true: visual.Circle = field(init=False)
+    _nav_left: visual.TextStim = field(init=False)
+    _nav_space: visual.TextStim = field(init=False)
+    _nav_right: visual.TextStim = field(init=False)
+    _rt_clock: core.Clock = field(init=False)
+    _fps: float = field(init=False)
+    _title_frames: int = field(init=False)
+    _isi_frames: int = field(init=False)
+    _object_frames: int = field(init=False)
 
     def __post_init__(self) -> None:
         # Load rule & mapping for TRAINING phase
@@ -82,16 +107,17 @@ class Training:
         self.object_mapping = get_object_mapping(self.subject_id, 'training')
         self.win = visual.Window(color="black",  size=(WIN_WIDTH, WIN_HEIGHT), units="norm")
         self.win = visual.Window(color="black", size=(1920, 1080), fullscr=True, units="norm", allowGUI=False,)
-        event.globalKeys.clear()
-        event.globalKeys.add(key="escape", func=self._exit)
 
         # Behaviour file
         BEHAVIOR_DIR.mkdir(exist_ok=True, parents=True)
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Large write buffer: rows are batched and the file is only flushed
+        # at block boundaries and in close(), so small writes stay in memory
         self.behavior_file = open(
             BEHAVIOR_DIR / f"subject_{self.subject_id}_training_behavior_{ts}.csv",
             "w",
-            newline=""
+            newline="",
+            buffering=65536
         )
         self.behavior_writer = csv.writer(self.behavior_file)
         self.behavior_writer.writerow([
@@ -115,8 +141,72 @@ class Training:
 
         # Deterministic RNG per participant
         self.rng = random.Random(self.subject_id)
+        self._text_cache = {}
+        # Quiz rows accumulate here and reach disk at block boundaries,
+        # keeping writerow/flush out of the feedback path
+        self._rows_buffer = []
+
+        # Letter/number labels for the rule displays are fixed per subject,
+        # so fold them once instead of rebuilding per draw
+        self._name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
+        self._ss1_chars = [self._name_mapping[self.inv_scrambling_rule[i]] for i in range(4)]
+        self._ss2_chars = [self._name_mapping[self.inv_scrambling_rule[i]] for i in range(4, 8)]
+        self._ss1_text = "-".join(self._ss1_chars)
+        self._ss2_text = "-".join(self._ss2_chars)
+        # Order-quiz title per true sequence, so no string is assembled
+        # while a response screen is about to flip
+        self._order_quiz_title = {
+            seq: 'Which comes later in the ' + ordinal_string(seq) + ' true sequence?'
+            for seq in (1, 2)
+        }
+        self._decoded_images = {}
         self.preload_images()
 
+        # The two rule-screen highlight rings only ever move, so build them
+        # once instead of compiling new circle vertex lists per showing
+        self._highlight_scrambled = visual.Circle(self.win, size=(.08, .105),
+                                                  lineColor='red', lineWidth=3, fillColor=None)
+        self._highlight_true = visual.Circle(self.win, size=(.08, .105),
+                                             lineColor='red', lineWidth=3, fillColor=None)
+
+        # Navigation labels sit at the bottom of nearly every screen; bind
+        # them once so left_right_msg skips the cache lookup per draw
+        self._nav_left = self.text_stim('< left', color='white', height=0.05, pos=(-.9, -.9))
+        self._nav_space = self.text_stim('Press space to continue', color='white', height=0.05, pos=(0, -.9))
+        self._nav_right = self.text_stim('right >', color='white', height=0.05, pos=(.9, -.9))
+
+        # One RT clock for both quizzes, reset on the flip that shows the
+        # question, instead of a fresh core.Clock per trial
+        self._rt_clock = core.Clock()
+
+        # Sequence presentation is timed in refresh counts so onsets stay
+        # locked to vsync rather than to core.wait's timer
+        self._fps = self.win.getActualFrameRate() or 60
+        self._title_frames = max(1, int(round(1.0 * self._fps)))
+        self._isi_frames = max(1, int(round(ISI * self._fps)))
+        self._object_frames = max(1, int(round(OBJECT_DURATION * self._fps)))
+
+    def _flush_rows(self) -> None:
+        """Write any buffered quiz rows to disk."""
+        if self._rows_buffer:
+            self.behavior_writer.writerows(self._rows_buffer)
+            self._rows_buffer.clear()
+            self.behavior_file.flush()
+
+    def text_stim(self, text: str, **kwargs) -> visual.TextStim:
+        """Return a cached TextStim for this (text, style) combination.
+
+        TextStim construction does font shaping and a texture upload on every
+        call, so the screens reuse one instance per unique label instead of
+        rebuilding it on each draw.
+        """
+        key = (text, tuple(sorted(kwargs.items())))
+        stim = self._text_cache.get(key)
+        if stim is None:
+            stim = visual.TextStim(self.win, text=text, **kwargs)
+            self._text_cache[key] = stim
+        return stim
+
     def _exit(self):
         print("Esc detected: ending experiment...")
         self.close()
@@ -125,10 +215,21 @@ class Training:
 
     def preload_images(self) -> None:
         """Preload images for the current mapping into PsychoPy stimuli cache."""
+        # Decode unseen images in parallel (PIL releases the GIL in its C
+        # decoder) and keep the decoded copies: a re-permuted mapping reuses
+        # the same files, so the reshuffle reloads skip disk and decode
+        to_decode = [obj_name for obj_name in self.object_mapping.values()
+                     if obj_name not in self._decoded_images]
+        if to_decode:
+            def _decode(obj_name: str) -> Image.Image:
+                img = Image.open(IMAGES_DIR / f"{obj_name}.png")
+                img.load()
+                return img
+            with ThreadPoolExecutor() as pool:
+                self._decoded_images.update(zip(to_decode, pool.map(_decode, to_decode)))
         self.object_stims = {}
         for letter, obj_name in self.object_mapping.items():
-            img_path = IMAGES_DIR / f"{obj_name}.png"
-            self.object_stims[letter] = visual.ImageStim(self.win, image=str(img_path))
+            self.object_stims[letter] = visual.ImageStim(self.win, image=self._decoded_images[obj_name])
 
     def close(self) -> None:
         """Close open resources."""
@@ -138,6 +239,7 @@ class Training:
         except Exception:
             pass
         try:
+            self._flush_rows()
             self.behavior_file.close()
         except Exception:
             pass
@@ -167,22 +269,24 @@ class Training:
         def left_right_msg(available_keys: list):
             """ Draw left/right/space navigation instructions for participants """
             if 'left' in available_keys:
-                visual.TextStim(self.win, text='< left', color='white', height=0.05, pos=(-.9, -.9)).draw()
+                self._nav_left.draw()
             if 'space' in available_keys:
-                visual.TextStim(self.win, text='Press space to continue', color='white', height=0.05, pos=(0, -.9)).draw()
+                self._nav_space.draw()
             if 'right' in available_keys:
-                visual.TextStim(self.win, text='right >', color='white', height=0.05, pos=(.9, -.9)).draw()
+                self._nav_right.draw()
             self.win.flip()
             keys = event.waitKeys(keyList=available_keys + ['escape'])
+            if keys[0] == 'escape':
+                self._exit()
             return keys
 
         # INTRO SCREENS (unchanged)
         def screen1():
-            visual.TextStim(self.win, text="Today's goal is to learn a rule that will unscramble two sequences of pictures.", height=0.1, pos=(0, 0)).draw()
+            self.text_stim("Today's goal is to learn a rule that will unscramble two sequences of pictures.", height=0.1, pos=(0, 0)).draw()
             return ['right']
 
         def screen2():
-            visual.TextStim(self.win, text='You will see two scrambled sequences like this...', height=0.1, pos=(0, 0)).draw()
+            self.text_stim('You will see two scrambled sequences like this...', height=0.1, pos=(0, 0)).draw()
             return ['left', 'right']
 
         def screen3():
@@ -190,7 +294,7 @@ class Training:
             return ['left', 'right']
 
         def screen4():
-            visual.TextStim(self.win, text='Using a rule (which you will learn), you\'ll have to *mentally* re-order ' + \
+            self.text_stim('Using a rule (which you will learn), you\'ll have to *mentally* re-order ' + \
             ' the pictures into two *true* sequences, like this...', height=0.1, pos=(0, 0)).draw()
             return ['left', 'right']
 
@@ -199,93 +303,97 @@ class Training:
             return ['left', 'right']
 
         def screen6():
-            visual.TextStim(self.win, text='Then you will have to answer questions, like: does ' + self.object_mapping['W'][1:] +
+            self.text_stim('Then you will have to answer questions, like: does ' + self.object_mapping['W'][1:] +
                             ' come before or after ' + self.object_mapping['X'][1:] + '?', height=0.1, pos=(0, .6)).draw()
-            visual.TextStim(self.win, text='But the questions will be about the true order, not the order you saw.', height=0.1, pos=(0, 0), bold=True).draw()
-            visual.TextStim(self.win, text="So you'll have to mentally reorder the sequences to answer these questions.", height=0.1, pos=(0, -.5)).draw()
+            self.text_stim('But the questions will be about the true order, not the order you saw.', height=0.1, pos=(0, 0), bold=True).draw()
+            self.text_stim("So you'll have to mentally reorder the sequences to answer these questions.", height=0.1, pos=(0, -.5)).draw()
             return ['left', 'right']
 
         def screen7():
-            visual.TextStim(self.win, text='Here is the rule. We will help you learn it today.', height=0.12, pos=(0, .7), bold=True).draw()
-
-            name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
-            ss_1 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4)])
-            ss_2 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)])
+            self.text_stim('Here is the rule. We will help you learn it today.', height=0.12, pos=(0, .7), bold=True).draw()
 
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.1, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text=ss_1, height=0.12, pos=(0, .3)).draw()
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
-            visual.TextStim(self.win, text=ss_2, height=0.12, pos=(0, .1)).draw()
+            self.text_stim('Scrambled sequence 1: ', height=0.1, pos=(0, .4)).draw()
+            self.text_stim(self._ss1_text, height=0.12, pos=(0, .3)).draw()
+            self.text_stim('Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
+            self.text_stim(self._ss2_text, height=0.12, pos=(0, .1)).draw()
 
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.1, pos=(0, -.2)).draw()
-            visual.TextStim(self.win, text='A-B-C-D', height=0.12, pos=(0, -.3)).draw()
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
-            visual.TextStim(self.win, text='1-2-3-4', height=0.12, pos=(0, -.5)).draw()
+            self.text_stim('True sequence 1: ', height=0.1, pos=(0, -.2)).draw()
+            self.text_stim('A-B-C-D', height=0.12, pos=(0, -.3)).draw()
+            self.text_stim('True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
+            self.text_stim('1-2-3-4', height=0.12, pos=(0, -.5)).draw()
             return ['left', 'right']
 
         def screen8():
-            visual.TextStim(self.win, text='Tomorrow, you will apply the same rule to unscramble new sequences of pictures.', height=0.1, pos=(0, .5)).draw()
-            visual.TextStim(self.win, text="You will earn points by applying today's rule to tomorrow's pictures.", height=0.1, pos=(0, .05)).draw()
-            visual.TextStim(self.win, text="So it's really important to learn the rule today.", height=0.1, pos=(0, -.35)).draw()
+            self.text_stim('Tomorrow, you will apply the same rule to unscramble new sequences of pictures.', height=0.1, pos=(0, .5)).draw()
+            self.text_stim("You will earn points by applying today's rule to tomorrow's pictures.", height=0.1, pos=(0, .05)).draw()
+            self.text_stim("So it's really important to learn the rule today.", height=0.1, pos=(0, -.35)).draw()
             return ['left', 'space']
 
         # Rules
+        _rule_bufs = {}
+
         def rule_screen(true_state: str):
-            """Focused rule explanation screen for a single state."""
-            name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
-            ss_1 = [name_mapping[self.reverse_state_lookup(i)] for i in range(4)]
-            ss_2 = [name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)]
+            """Focused rule explanation screen for a single state.
+
+            The ~30 stims on this screen are fixed for a given state, so the
+            first visit renders them into one BufferImageStim and later
+            visits blit that single texture instead of issuing a GL draw
+            per stim.
+            """
+            buf = _rule_bufs.get(true_state)
+            if buf is not None:
+                buf.draw()
+                return
 
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.07, pos=(-.67, .8)).draw()
+            ss_1 = self._ss1_chars
+            ss_2 = self._ss2_chars
+
+            stims = [self.text_stim('Scrambled sequence 1: ', height=0.07, pos=(-.67, .8))]
             for i, s in enumerate(ss_1):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(-.32 + i * 0.09, .8)).draw()
+                stims.append(self.text_stim(s, height=0.12, pos=(-.32 + i * 0.09, .8)))
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(-.28 + i * 0.09, .8)).draw()
+                stims.append(self.text_stim('-', height=0.12, pos=(-.28 + i * 0.09, .8)))
 
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.07, pos=(-.67, .65)).draw()
+            stims.append(self.text_stim('Scrambled sequence 2: ', height=0.07, pos=(-.67, .65)))
             for i, s in enumerate(ss_2):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(-.32 + i * 0.09, .65)).draw()
+                stims.append(self.text_stim(s, height=0.12, pos=(-.32 + i * 0.09, .65)))
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(-.28 + i * 0.09, .65)).draw()
+                stims.append(self.text_stim('-', height=0.12, pos=(-.28 + i * 0.09, .65)))
 
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.07, pos=(.37, .8)).draw()
+            stims.append(self.text_stim('True sequence 1: ', height=0.07, pos=(.37, .8)))
             for i, s in enumerate(['A', 'B', 'C', 'D']):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(.62 + i * 0.09, .8)).draw()
+                stims.append(self.text_stim(s, height=0.12, pos=(.62 + i * 0.09, .8)))
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(.66 + i * 0.09, .8)).draw()
+                stims.append(self.text_stim('-', height=0.12, pos=(.66 + i * 0.09, .8)))
 
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.07, pos=(.37, .65)).draw()
+            stims.append(self.text_stim('True sequence 2: ', height=0.07, pos=(.37, .65)))
             for i, s in enumerate(['1', '2', '3', '4']):
-                visual.TextStim(self.win, text=s, height=0.12, pos=(.62 + i * 0.09, .65)).draw()
+                stims.append(self.text_stim(s, height=0.12, pos=(.62 + i * 0.09, .65)))
             for i in range(3):
-                visual.TextStim(self.win, text='-', height=0.12, pos=(.66 + i * 0.09, .65)).draw()
+                stims.append(self.text_stim('-', height=0.12, pos=(.66 + i * 0.09, .65)))
 
-            visual.TextStim(self.win, text="Here's one piece of the rule:", height=0.1, pos=(0, .2)).draw()
+            stims.append(self.text_stim("Here's one piece of the rule:", height=0.1, pos=(0, .2)))
 
             pos, seq = get_pos_and_seq(true_state)
             s_pos, s_seq = get_scrambled_pos_and_seq(self.scrambling_rule[true_state])
 
             # Highlight the scrambled state
-            visual.Circle(
-                self.win, size=(.08, .105),
-                pos=(-.32 + (s_pos - 1) * 0.09, 0.65 + 0.15 * int(s_seq == 1)),
-                lineColor='red', lineWidth=3, fillColor=None
-            ).draw()
+            self._highlight_scrambled.pos = (-.32 + (s_pos - 1) * 0.09, 0.65 + 0.15 * int(s_seq == 1))
+            stims.append(self._highlight_scrambled)
 
             # Highlight the true state
-            visual.Circle(
-                self.win, size=(.08, .105),
-                pos=(0.62 + (pos - 1) * 0.09, 0.65 + 0.15 * int(seq == 1)),
-                lineColor='red', lineWidth=3, fillColor=None
-            ).draw()
-
-            visual.TextStim(
-                self.win,
-                text='The ' + ordinal_string(s_pos) + ' picture in the ' + ordinal_string(s_seq) +
-                     ' scrambled sequence is the ' + ordinal_string(pos) + ' picture of the ' +
-                     ordinal_string(seq) + ' true sequence.',
+            self._highlight_true.pos = (0.62 + (pos - 1) * 0.09, 0.65 + 0.15 * int(seq == 1))
+            stims.append(self._highlight_true)
+
+            stims.append(self.text_stim(
+                'The ' + ordinal_string(s_pos) + ' picture in the ' + ordinal_string(s_seq) +
+                ' scrambled sequence is the ' + ordinal_string(pos) + ' picture of the ' +
+                ordinal_string(seq) + ' true sequence.',
                 height=0.1, pos=(0, -.2)
-            ).draw()
+            ))
+
+            buf = _rule_bufs[true_state] = visual.BufferImageStim(self.win, stim=stims)
+            buf.draw()
 
         def sequences_screen(seq_type: str, states_to_show: dict = None):
             """
@@ -300,17 +408,21 @@ class Training:
             # Clear the screen first
             self.win.flip()
             
-            # Show sequence 1 title, then wait briefly
-            visual.TextStim(self.win, text=seq_type + ' sequence 1', height=0.12, pos=(0,0)).draw()
-            self.win.flip()
-            core.wait(1)  # Brief pause to read title
+            # Show sequence 1 title for a fixed number of refreshes
+            title = self.text_stim(seq_type + ' sequence 1', height=0.12, pos=(0,0))
+            title.setAutoDraw(True)
+            for _ in range(self._title_frames):
+                self.win.flip()
+            title.setAutoDraw(False)
             
             # Sequence 1: positions [0..3] with fixation before each stimulus
             for position in [0, 1, 2, 3]:
                 # Fixation cross (no sequence title)
-                visual.TextStim(self.win, text='+', color='white', height=0.3, pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(ISI)
+                fixation = self.text_stim('+', color='white', height=0.3, pos=(0,0))
+                fixation.setAutoDraw(True)
+                for _ in range(self._isi_frames):
+                    self.win.flip()
+                fixation.setAutoDraw(False)
 
                 # Get state name from its position
                 if seq_type == 'Scrambled':
@@ -320,27 +432,33 @@ class Training:
                 
                 # Draw stimulus or text name
                 if states_to_show[state_name]:
-                    self.get_object(state_name, size=(0.5, 0.5), pos=(0,0)).draw()
+                    stim = self.get_object(state_name, size=(0.5, 0.5), pos=(0,0))
                 else:
-                    visual.TextStim(self.win, text=state_name, height=0.1, pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(OBJECT_DURATION)
+                    stim = self.text_stim(state_name, height=0.1, pos=(0,0))
+                stim.setAutoDraw(True)
+                for _ in range(self._object_frames):
+                    self.win.flip()
+                stim.setAutoDraw(False)
             
             # Clear and prepare for sequence 2
-            self.win.flip()
-            core.wait(ISI)
+            for _ in range(self._isi_frames):
+                self.win.flip()
 
-            # Show sequence 2 title, then wait briefly  
-            visual.TextStim(self.win, text=seq_type + ' sequence 2', height=0.12, pos=(0,0)).draw()
-            self.win.flip()
-            core.wait(1)  # Brief pause to read title
+            # Show sequence 2 title for a fixed number of refreshes
+            title = self.text_stim(seq_type + ' sequence 2', height=0.12, pos=(0,0))
+            title.setAutoDraw(True)
+            for _ in range(self._title_frames):
+                self.win.flip()
+            title.setAutoDraw(False)
 
             # Sequence 2: positions [4..7] with fixation before each stimulus
             for position in [4, 5, 6, 7]:
                 # Fixation cross (no sequence title)
-                visual.TextStim(self.win, text='+', color='white', height=0.3, pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(ISI)
+                fixation = self.text_stim('+', color='white', height=0.3, pos=(0,0))
+                fixation.setAutoDraw(True)
+                for _ in range(self._isi_frames):
+                    self.win.flip()
+                fixation.setAutoDraw(False)
 
                 # Get state name from its position
                 if seq_type == 'Scrambled':
@@ -350,15 +468,17 @@ class Training:
                 
                 # Draw stimulus or text name
                 if states_to_show[state_name]:
-                    self.get_object(state_name, size=(0.5, 0.5), pos=(0,0)).draw()
+                    stim = self.get_object(state_name, size=(0.5, 0.5), pos=(0,0))
                 else:
-                    visual.TextStim(self.win, text=state_name, height=0.1, pos=(0,0)).draw()
-                self.win.flip()
-                core.wait(OBJECT_DURATION)
+                    stim = self.text_stim(state_name, height=0.1, pos=(0,0))
+                stim.setAutoDraw(True)
+                for _ in range(self._object_frames):
+                    self.win.flip()
+                stim.setAutoDraw(False)
 
             # Final clear
-            self.win.flip()
-            core.wait(ISI)
+            for _ in range(self._isi_frames):
+                self.win.flip()
 
         def seq_quiz_screen_base(true_state: str):
             """
@@ -369,21 +489,21 @@ class Training:
             stim_number = state_map[true_state]
             stim_seq = 1 if true_state in ['W', 'X', 'Y', 'Z'] else 2
 
-            visual.TextStim(self.win, text='Which sequence does', height=0.1, pos=(0, .7)).draw()
+            self.text_stim('Which sequence does', height=0.1, pos=(0, .7)).draw()
             self.get_object(true_state, size=(0.3, 0.3), pos=(0, .5)).draw()
-            visual.TextStim(self.win, text='belong to?', height=0.1, pos=(0, .3)).draw()
+            self.text_stim('belong to?', height=0.1, pos=(0, .3)).draw()
 
             true_pos, true_seq = get_pos_and_seq(true_state)
 
             # Draw the two choices
-            visual.TextStim(self.win, text='Sequence 1', height=0.1, pos=(-.5, -.45)).draw()
-            visual.TextStim(self.win, text='Sequence 2', height=0.1, pos=(.5, -.45)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5, -.6)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5, -.6)).draw()
+            self.text_stim('Sequence 1', height=0.1, pos=(-.5, -.45)).draw()
+            self.text_stim('Sequence 2', height=0.1, pos=(.5, -.45)).draw()
+            self.text_stim('(Press left)', height=0.07, pos=(-.5, -.6)).draw()
+            self.text_stim('(Press right)', height=0.07, pos=(.5, -.6)).draw()
             
+            self.win.callOnFlip(self._rt_clock.reset)
             self.win.flip()
-            clock = core.Clock()
-            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=clock)
+            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=self._rt_clock)
             key, rt = key_data[0]
             
             if key == "escape":
@@ -393,44 +513,39 @@ class Training:
             correct_bool = ((key == "left") and (true_seq == 1)) or ((key == "right") and (true_seq == 2))
             
             if correct_bool:
-                visual.TextStim(self.win, text="Correct!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Correct!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
                 core.wait(MESSAGE_DURATION)
                 result = "correct"
             else:
                 # SIMPLIFIED: Just show "Incorrect!" without the explanation
-                visual.TextStim(self.win, text="Incorrect!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Incorrect!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
                 core.wait(MESSAGE_DURATION)
                 result = "incorrect"
 
             choice_stim_seq = chosen_seq
 
-            # Save to CSV
-            try:
-                self.behavior_writer.writerow([
-                    self.subject_id,
-                    "sequence",
-                    picture_name,
-                    true_state,
-                    stim_number,
-                    stim_seq,
-                    "",        # right_stimulus_picture
-                    "",        # right_stimulus_true_state
-                    "",        # right_stim_number
-                    "",        # right_stim_seq
-                    key,
-                    chosen_seq,
-                    stim_number,
-                    choice_stim_seq,        
-                    result,
-                    rt,
-                ])
-                self.behavior_file.flush()
-                os.fsync(self.behavior_file.fileno())
-            except Exception as e:
-                print(f"Error writing to CSV: {e}")
-                
+            # Save to CSV (buffered; flushed at block boundaries)
+            self._rows_buffer.append([
+                self.subject_id,
+                "sequence",
+                picture_name,
+                true_state,
+                stim_number,
+                stim_seq,
+                "",        # right_stimulus_picture
+                "",        # right_stimulus_true_state
+                "",        # right_stim_number
+                "",        # right_stim_seq
+                key,
+                chosen_seq,
+                stim_number,
+                choice_stim_seq,
+                result,
+                rt,
+            ])
+
             return result
 
         def order_quiz_screen_base(true_state_1: str, true_state_2: str):
@@ -442,18 +557,17 @@ class Training:
             true_pos_2, true_seq_2 = get_pos_and_seq(true_state_2)
             assert true_seq_1 == true_seq_2, 'ERROR: Can only compare order within one true sequence'
 
-            visual.TextStim(self.win, text='Which comes later in the ' + ordinal_string(true_seq_1) + ' true sequence?',
-                            height=0.1, pos=(0, .4)).draw()
+            self.text_stim(self._order_quiz_title[true_seq_1], height=0.1, pos=(0, .4)).draw()
 
             # Draw the two choices
             self.get_object(true_state_1, size=(0.3, 0.3), pos=(-.5, -.4)).draw()
             self.get_object(true_state_2, size=(0.3, 0.3), pos=(.5, -.4)).draw()
-            visual.TextStim(self.win, text='(Press left)', height=0.07, pos=(-.5, -.7)).draw()
-            visual.TextStim(self.win, text='(Press right)', height=0.07, pos=(.5, -.7)).draw()
+            self.text_stim('(Press left)', height=0.07, pos=(-.5, -.7)).draw()
+            self.text_stim('(Press right)', height=0.07, pos=(.5, -.7)).draw()
             
+            self.win.callOnFlip(self._rt_clock.reset)
             self.win.flip()
-            clock = core.Clock()
-            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=clock)
+            key_data = event.waitKeys(keyList=["left", "right", "escape"], timeStamped=self._rt_clock)
             key, rt = key_data[0]
             
             if key == "escape":
@@ -466,13 +580,13 @@ class Training:
             correct_bool = ((key == "left") and (not first_on_left)) or ((key == "right") and first_on_left)
             
             if correct_bool:
-                visual.TextStim(self.win, text="Correct!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Correct!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
                 core.wait(MESSAGE_DURATION)
                 result = "correct"
             else:
                 # SIMPLIFIED: Just show "Incorrect!" without the explanation
-                visual.TextStim(self.win, text="Incorrect!", height=0.1, pos=(0, 0)).draw()
+                self.text_stim("Incorrect!", height=0.1, pos=(0, 0)).draw()
                 self.win.flip()
                 core.wait(MESSAGE_DURATION)
                 result = "incorrect"
@@ -483,31 +597,26 @@ class Training:
             r_stim_seq = 1 if true_state_2 in ['W', 'X', 'Y', 'Z'] else 2
             choice_stim_seq = 1 if chosen_state in ['W', 'X', 'Y', 'Z'] else 2
 
-            # Save to CSV
-            try:
-                self.behavior_writer.writerow([
-                    self.subject_id,
-                    "order",
-                    self.object_mapping[true_state_1][1:],
-                    true_state_1,
-                    l_stim_number,
-                    l_stim_seq,
-                    self.object_mapping[true_state_2][1:],
-                    true_state_2,
-                    r_stim_number,
-                    r_stim_seq,
-                    key,
-                    chosen_state,
-                    chosen_state_num,
-                    choice_stim_seq,          
-                    result,
-                    rt,
-                ])
-                self.behavior_file.flush()
-                os.fsync(self.behavior_file.fileno())
-            except Exception as e:
-                print(f"Error writing to CSV: {e}")
-                
+            # Save to CSV (buffered; flushed at block boundaries)
+            self._rows_buffer.append([
+                self.subject_id,
+                "order",
+                self.object_mapping[true_state_1][1:],
+                true_state_1,
+                l_stim_number,
+                l_stim_seq,
+                self.object_mapping[true_state_2][1:],
+                true_state_2,
+                r_stim_number,
+                r_stim_seq,
+                key,
+                chosen_state,
+                chosen_state_num,
+                choice_stim_seq,
+                result,
+                rt,
+            ])
+
             return result
 
         # SIMPLIFIED retry wrappers
@@ -557,26 +666,21 @@ class Training:
 
         def show_full_rule_screen():
             """Show the full rule with letters/numbers (no images)."""
-            visual.TextStim(self.win, text="Now, we will quiz you about any part of this rule.", height=0.1, pos=(0, .7)).draw()
+            self.text_stim("Now, we will quiz you about any part of this rule.", height=0.1, pos=(0, .7)).draw()
 
-            name_mapping = {'W': 'A', 'X': 'B', 'Y': 'C', 'Z': 'D', 'Wp': '1', 'Xp': '2', 'Yp': '3', 'Zp': '4'}
-            
             # Scrambled sequences
-            ss_1 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4)])
-            ss_2 = "-".join([name_mapping[self.reverse_state_lookup(i)] for i in range(4, 8)])
-            
-            visual.TextStim(self.win, text='Scrambled sequence 1: ', height=0.1, pos=(0, .5)).draw()
-            visual.TextStim(self.win, text=ss_1, height=0.12, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text='Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
-            visual.TextStim(self.win, text=ss_2, height=0.12, pos=(0, .1)).draw()
+            self.text_stim('Scrambled sequence 1: ', height=0.1, pos=(0, .5)).draw()
+            self.text_stim(self._ss1_text, height=0.12, pos=(0, .4)).draw()
+            self.text_stim('Scrambled sequence 2: ', height=0.1, pos=(0, .2)).draw()
+            self.text_stim(self._ss2_text, height=0.12, pos=(0, .1)).draw()
             
             # True sequences
-            visual.TextStim(self.win, text='True sequence 1: ', height=0.1, pos=(0, -.1)).draw()
-            visual.TextStim(self.win, text='A-B-C-D', height=0.12, pos=(0, -.2)).draw()
-            visual.TextStim(self.win, text='True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
-            visual.TextStim(self.win, text='1-2-3-4', height=0.12, pos=(0, -.5)).draw()
+            self.text_stim('True sequence 1: ', height=0.1, pos=(0, -.1)).draw()
+            self.text_stim('A-B-C-D', height=0.12, pos=(0, -.2)).draw()
+            self.text_stim('True sequence 2: ', height=0.1, pos=(0, -.4)).draw()
+            self.text_stim('1-2-3-4', height=0.12, pos=(0, -.5)).draw()
             
-            visual.TextStim(self.win, text="Press space to continue", height=0.05, pos=(0, -.9)).draw()
+            self.text_stim("Press space to continue", height=0.05, pos=(0, -.9)).draw()
 
 
         # ================= Intro navigator =================
@@ -596,16 +700,32 @@ class Training:
             elif k == 'escape':
                 self.close()
                 core.quit()
-            screen_ix = np.maximum(np.minimum(screen_ix, len(intro_screens)-1), 0)
         
-        # Initialize learning levels to zero
+        # Initialize learning levels to zero, with per-level buckets so the
+        # per-trial queries below don't rescan the whole dict
         learning_levels = {state: 0 for state in true_state_names}
-        
-        def states_at_level(dict_of_levels, level: int):
-            return [k for k, v in dict_of_levels.items() if v == level]
+        level_buckets = {0: set(true_state_names)}
+
+        def set_level(state, new_level: int):
+            old_level = learning_levels[state]
+            if new_level != old_level:
+                level_buckets[old_level].discard(state)
+                level_buckets.setdefault(new_level, set()).add(state)
+                learning_levels[state] = new_level
 
-        def states_above_level(dict_of_levels, level: int):
-            return [k for k, v in dict_of_levels.items() if v > level]
+        def lowest_level():
+            return min(lvl for lvl, bucket in level_buckets.items() if bucket)
+
+        def states_at_level(level: int):
+            # state_map order matches the old dict-scan order, keeping
+            # self.rng.choice reproducible
+            return sorted(level_buckets.get(level, ()), key=state_map.get)
+
+        def states_above_level(level: int):
+            # Flatten first, sort once: the old dict scan returned states in
+            # state_map order regardless of level
+            return sorted((s for lvl, bucket in level_buckets.items() if lvl > level
+                           for s in bucket), key=state_map.get)
 
         def random_state_from_same_seq(state_name):
             pos, seq = get_pos_and_seq(state_name)
@@ -627,13 +747,14 @@ class Training:
 
         def reshuffle_pictures():
 
-            visual.TextStim(self.win, text='Now we\'ll show a *new sequence* of pictures.', height=0.1, pos=(0, .6)).draw()
-            visual.TextStim(self.win, text='The rule always stays the same.', height=0.1, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text='Sometimes we won\'t show all the pictures in the sequence, ' + \
+            self.text_stim('Now we\'ll show a *new sequence* of pictures.', height=0.1, pos=(0, .6)).draw()
+            self.text_stim('The rule always stays the same.', height=0.1, pos=(0, .4)).draw()
+            self.text_stim('Sometimes we won\'t show all the pictures in the sequence, ' + \
                 'to keep things simpler.', height=0.1, pos=(0, 0)).draw()
-            visual.TextStim(self.win, text="(Press space to continue)", height=0.07, pos=(0, -.7)).draw()
+            self.text_stim("(Press space to continue)", height=0.07, pos=(0, -.7)).draw()
             self.win.flip()
-            event.waitKeys(keyList=["space"])
+            if event.waitKeys(keyList=["space", "escape"])[0] == 'escape':
+                self._exit()
 
             # Re-permute the visual objects and show the scrambled sequence
             self.object_mapping = get_object_mapping(self.subject_id, 'training', force_new=True)
@@ -642,11 +763,11 @@ class Training:
         def no_reshuffle():
             ''' Display messages indicating that the pictures are NOT reshuffling 
             '''
-            visual.TextStim(self.win, text='Now we\'ll show you a couple more pictures in the SAME scrambled sequences.', height=0.1, pos=(0, .4)).draw()
-            visual.TextStim(self.win, text="(Press space to continue)", height=0.07, pos=(0, -.7)).draw()
+            self.text_stim('Now we\'ll show you a couple more pictures in the SAME scrambled sequences.', height=0.1, pos=(0, .4)).draw()
+            self.text_stim("(Press space to continue)", height=0.07, pos=(0, -.7)).draw()
             self.win.flip()
-            event.waitKeys(keyList=["space"])
-
+            if event.waitKeys(keyList=["space", "escape"])[0] == 'escape':
+                self._exit()
 
 
         def do_quizzes(learning_levels, quiz_state_1, quiz_state_2, states_to_show):
@@ -662,11 +783,11 @@ class Training:
 
             # Update learning levels based on performance
             if quiz_result_1 == 'correct':
-                learning_levels[quiz_state_1] += 1
+                set_level(quiz_state_1, learning_levels[quiz_state_1] + 1)
             else:
                 # Do not allow learning level to drop below 0
                 if learning_levels[quiz_state_1] > 0:
-                    learning_levels[quiz_state_1] -= 1
+                    set_level(quiz_state_1, learning_levels[quiz_state_1] - 1)
 
                 # If there was an error, we will refresh this part of the rule
                 rule_screen(true_state=quiz_state_1)
@@ -682,11 +803,11 @@ class Training:
 
             # Update learning levels based on performance
             if quiz_result_2 == 'correct':
-                learning_levels[quiz_state_1] += 1
-                learning_levels[quiz_state_2] += 1
+                set_level(quiz_state_1, learning_levels[quiz_state_1] + 1)
+                set_level(quiz_state_2, learning_levels[quiz_state_2] + 1)
             else:
-                learning_levels[quiz_state_1] = 0
-                learning_levels[quiz_state_2] = 0
+                set_level(quiz_state_1, 0)
+                set_level(quiz_state_2, 0)
 
                 # If there was an error, we will refresh these two parts of the rule
                 rule_screen(true_state=quiz_state_1)
@@ -698,11 +819,11 @@ class Training:
         # ================= Train pieces of rule =================
 
         # Loop through until all parts of the rule have gained proficiency
-        current_lowest_level = min(learning_levels.values())
+        current_lowest_level = lowest_level()
         while current_lowest_level < 3:
 
             # Train two states, where at least one comes from the least-learned tier
-            train_state_1 = self.rng.choice(states_at_level(learning_levels, current_lowest_level))
+            train_state_1 = self.rng.choice(states_at_level(current_lowest_level))
             rule_screen(true_state=train_state_1)
             left_right_msg(['space'])
 
@@ -727,7 +848,7 @@ class Training:
                 do_quizzes(learning_levels, quiz_state_1, quiz_state_2, states_to_show)
 
                 # Also quiz on any two other well-learned states, if there are any two belonging to the same sequence
-                strong_states = set(states_above_level(learning_levels, 1))
+                strong_states = set(states_above_level(1))
                 strong_states_diff = list(strong_states - set([train_state_1, train_state_2]))
                 if strong_states_diff:
                     for _ in range(len(strong_states)):
@@ -742,6 +863,10 @@ class Training:
                         sequences_screen('Scrambled', states_to_show)
                         do_quizzes(learning_levels, quiz_state_1, quiz_state_2, states_to_show)
 
+            # Push this block's rows to disk between trials
+            self._flush_rows()
+            current_lowest_level = lowest_level()
+
         # ================= Open quizzes on all states, under a stable mapping =================
 
         reshuffle_pictures()
@@ -753,13 +878,14 @@ class Training:
 
             do_quizzes(learning_levels, quiz_state_1, quiz_state_2)
 
+        self._flush_rows()
 
         # ================= End-of-session screen =================
 
-        visual.TextStim(self.win, text="All done. Great job.", height=0.1, pos=(0, 0.0)).draw()
-        visual.TextStim(self.win, text="Press space to exit", height=0.07, pos=(0, -0.5)).draw()
+        self.text_stim("All done. Great job.", height=0.1, pos=(0, 0.0)).draw()
+        self.text_stim("Press space to exit", height=0.07, pos=(0, -0.5)).draw()
         self.win.flip()
-        event.waitKeys(keyList=["space"])
+        event.waitKeys(keyList=["space", "escape"])
         self.close()
         core.quit()
 
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import queue
+import threading
 import time
 import sys
 import json
@@ -31,6 +33,12 @@ class MetaPort:
         self.actual_meg = actual_meg
         self.subject_ID = subject_ID
 
+        # Triggers are pulsed from a worker thread, so the 100 ms pulse
+        # width never blocks the stimulus loop
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
+
         if self.actual_meg:
             try:
                 self.actual_meg = psychopy.parallel.ParallelPort(16376)
@@ -46,9 +54,19 @@ class MetaPort:
             print("####################################################")
 
 
+    def _drain(self):
+        """Worker loop: pulse queued triggers until the sentinel arrives."""
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            self._write_now(message)
+
     def write(self, message):
-        """Writes a dict to a file, possibly writes to triggers"""
-        
+        """Queue a trigger; the worker thread performs the actual pulse."""
+        self._queue.put(message)
+
+    def _write_now(self, message):
         value = human_to_byte[message]
         if self.is_connected:
             self.actual_meg.setData(value)
@@ -59,7 +77,10 @@ class MetaPort:
             print(f"Would have sent the MEG: {message}, i.e. {value} / {value:>08b}")
 
     def close(self):
-        """Ensures the MEG is back to 0"""
+        """Drains pending triggers and ensures the MEG is back to 0"""
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout=5)
         if self.is_connected:
             self.actual_meg.setData(0)
 
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import json
 import math
+from functools import lru_cache
 import os
 from pathlib import Path
 import random
@@ -61,6 +62,7 @@ TRAINING_OBJECTS = [
     "3balloon",
 ]
 
+@lru_cache(maxsize=None)
 def get_pos_and_seq(state_name: str) -> tuple[int, int]:
     """Return the position and sequence index for a given state."""
     if "p" in state_name:
@@ -73,6 +75,7 @@ def get_pos_and_seq(state_name: str) -> tuple[int, int]:
         pos = poses[state_name]
     return pos, seq
 
+@lru_cache(maxsize=None)
 def get_scrambled_pos_and_seq(scrambled_state: int) -> tuple[int, int]:
     """Return the position and sequence for a scrambled state index."""
     pos = (scrambled_state % 4) + 1